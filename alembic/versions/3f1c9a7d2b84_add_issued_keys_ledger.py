@@ -0,0 +1,54 @@
+"""Add issued keys ledger
+
+Revision ID: 3f1c9a7d2b84
+Revises: 6daca0ba417e
+Create Date: 2026-10-19 12:10:41.305127
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b84'
+down_revision: Union[str, None] = '6daca0ba417e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _add_months(month: date, months: int) -> date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, month_index + 1, 1)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'issued_keys',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('issued_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('game', sa.String(length=50), nullable=False),
+        sa.Column('promo_code', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'issued_at'),
+        postgresql_partition_by='RANGE (issued_at)',
+    )
+    op.create_index('ix_issued_keys_user_id_issued_at', 'issued_keys', ['user_id', 'issued_at'], unique=False)
+    op.create_index('ix_issued_keys_promo_code', 'issued_keys', ['promo_code'], unique=False)
+
+    # Partitions for the following months are created by the bot
+    current_month = datetime.now(timezone.utc).date().replace(day=1)
+    for offset in range(3):
+        month = _add_months(current_month, offset)
+        op.execute(
+            f"CREATE TABLE issued_keys_y{month:%Y}m{month:%m} PARTITION OF issued_keys "
+            f"FOR VALUES FROM ('{month} 00:00+00') TO ('{_add_months(month, 1)} 00:00+00')"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_issued_keys_promo_code', table_name='issued_keys')
+    op.drop_index('ix_issued_keys_user_id_issued_at', table_name='issued_keys')
+    op.drop_table('issued_keys')
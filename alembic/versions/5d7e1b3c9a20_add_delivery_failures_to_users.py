@@ -0,0 +1,26 @@
+"""Add delivery failures to users
+
+Revision ID: 5d7e1b3c9a20
+Revises: 8b2e4c6f1a95
+Create Date: 2026-10-19 15:10:42.518304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7e1b3c9a20'
+down_revision: Union[str, None] = '8b2e4c6f1a95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('delivery_failures', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'delivery_failures')
@@ -0,0 +1,80 @@
+"""Partition user logs by month
+
+Revision ID: 8b2e4c6f1a95
+Revises: 3f1c9a7d2b84
+Create Date: 2026-10-19 14:02:17.846210
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4c6f1a95'
+down_revision: Union[str, None] = '3f1c9a7d2b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _add_months(month: date, months: int) -> date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, month_index + 1, 1)
+
+
+def upgrade() -> None:
+    op.rename_table('user_logs', 'user_logs_old')
+    op.execute("ALTER TABLE user_logs_old RENAME CONSTRAINT user_logs_pkey TO user_logs_old_pkey")
+    op.execute("ALTER SEQUENCE user_logs_id_seq RENAME TO user_logs_old_id_seq")
+
+    op.create_table(
+        'user_logs',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('action', sa.Text(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'timestamp'),
+        postgresql_partition_by='RANGE (timestamp)',
+    )
+    op.create_index('ix_user_logs_user_id_timestamp', 'user_logs', ['user_id', 'timestamp'], unique=False)
+
+    # Partitions cover the existing logs, the following months are created by the bot
+    current_month = datetime.now(timezone.utc).date().replace(day=1)
+    oldest = op.get_bind().execute(
+        sa.text("SELECT MIN(timestamp AT TIME ZONE 'UTC') FROM user_logs_old")
+    ).scalar()
+    month = min(oldest.date().replace(day=1), current_month) if oldest else current_month
+    while month <= _add_months(current_month, 2):
+        op.execute(
+            f"CREATE TABLE user_logs_y{month:%Y}m{month:%m} PARTITION OF user_logs "
+            f"FOR VALUES FROM ('{month} 00:00+00') TO ('{_add_months(month, 1)} 00:00+00')"
+        )
+        month = _add_months(month, 1)
+
+    op.execute(
+        "INSERT INTO user_logs (user_id, action, timestamp) "
+        "SELECT user_id, action, COALESCE(timestamp, now()) FROM user_logs_old ORDER BY id"
+    )
+    op.drop_table('user_logs_old')
+
+
+def downgrade() -> None:
+    op.rename_table('user_logs', 'user_logs_partitioned')
+    op.execute("ALTER TABLE user_logs_partitioned RENAME CONSTRAINT user_logs_pkey TO user_logs_partitioned_pkey")
+    op.execute("ALTER SEQUENCE user_logs_id_seq RENAME TO user_logs_partitioned_id_seq")
+
+    op.create_table(
+        'user_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('action', sa.Text(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute(
+        "INSERT INTO user_logs (user_id, action, timestamp) "
+        "SELECT user_id, action, timestamp FROM user_logs_partitioned ORDER BY id"
+    )
+    op.drop_table('user_logs_partitioned')
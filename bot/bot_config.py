@@ -1,3 +1,4 @@
+import hashlib
 import os
 
 from aiogram.client.bot import Bot, DefaultBotProperties
@@ -14,6 +15,28 @@ load_dotenv()
 # Forwarding message to groups
 GROUP_CHAT_ID = int(os.getenv("GROUP_CHAT_ID", 0))
 
+# How many months of the issued keys ledger are kept
+ISSUED_KEYS_RETENTION_MONTHS = int(os.getenv("ISSUED_KEYS_RETENTION_MONTHS", 6))
+# How many months of user activity logs are kept
+USER_LOGS_RETENTION_MONTHS = int(os.getenv("USER_LOGS_RETENTION_MONTHS", 3))
+
 API_TOKEN = os.getenv('BOT_TOKEN')
 BOT_ID = int(API_TOKEN.split(':')[0])
 bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+# Updates of different users handled at the same time by one worker
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 100))
+
+# "polling" for development, "webhook" to receive updates through the built-in web server
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Public address Telegram sends updates to, e.g. https://bot.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Telegram sends it with every update, all workers and instances have to use the same one
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(API_TOKEN.encode()).hexdigest()
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+# Processes sharing the web server port
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 1))
+# Processes handling updates, limits shared by the whole bot are divided between them
+BOT_WORKERS = WEBHOOK_WORKERS if BOT_MODE == 'webhook' else 1
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from sqlalchemy.future import select
+
+from bot.bot_config import logger
+from db.database import get_session
+
+from .models import User
+
+
+class AdminRoster:
+    """
+    Keeps the user and chat ids of the admins in memory, so routing support messages needs no queries.
+    Roles are only changed in the database: the roster is reloaded periodically, and `refresh()`
+    makes a change visible at once on the instance that calls it.
+    """
+
+    def __init__(self, refresh_interval: int = 60) -> None:
+        self.refresh_interval = refresh_interval
+        # Chat id of every admin by user id
+        self._admins: Dict[int, int] = {}
+        self._loaded: bool = False
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._worker and not self._worker.done():
+            return
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def refresh(self) -> None:
+        """Reloading the admins from the database"""
+        try:
+            async with await get_session() as session:
+                result = await session.execute(select(User.user_id, User.chat_id).where(User.user_role == 'admin'))
+                admins: Dict[int, int] = {row.user_id: row.chat_id for row in result.fetchall()}
+        except Exception as e:
+            logger.error(f"Error loading the admin roster: {e}")
+            return
+
+        if self._loaded and admins != self._admins:
+            logger.info(f"Admin roster changed: {len(admins)} admins")
+        self._admins = admins
+        self._loaded = True
+
+    async def is_admin(self, user_id: int) -> bool:
+        if not self._loaded:
+            await self.refresh()
+        return user_id in self._admins
+
+    async def get_chat_ids(self) -> List[int]:
+        if not self._loaded:
+            await self.refresh()
+        return list(self._admins.values())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+
+admin_roster = AdminRoster()
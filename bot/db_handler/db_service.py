@@ -1,9 +1,13 @@
 import os
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+import time
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from sqlalchemy import func, text, update
+from sqlalchemy import case, exists, func, literal, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
@@ -11,44 +15,130 @@ from bot.bot_config import logger
 from config.redis_config import redis_manager as redis_client
 from db.database import get_session
 
-from .models import User, UserLog
+from .admin_roster import admin_roster
+from .models import IssuedKey, User
+from .user_counters import DAILY_REQUESTS_KEY, PendingCounters, user_counters
+from .user_log_writer import user_log_writer
+from .user_profile_cache import (
+    PROFILE_COLUMNS,
+    UserProfile,
+    cache_profile,
+    get_cached_profile,
+    invalidate_user_profile,
+    profile_from_row,
+)
 
 load_dotenv()
 
+# Per-game stock counters kept in Redis
+KEYS_STOCK = "keys:stock"
+KEYS_STOCK_LAST_ID = "keys:stock:last_id"
+KEYS_STOCK_SYNCED = "keys:stock:synced"
+KEYS_RELOAD_LOCK = "keys:reload_lock:{}"
+STOCK_REFRESH_INTERVAL = 10
+# Rows are counted by id, and a row whose transaction commits after one with a higher id is missed
+# by the incremental refresh; the full recount picks such rows up within this interval
+STOCK_RESYNC_INTERVAL = 300
+
+# User languages cached in Redis, shared by all workers and instances so a change shows everywhere at once
+USER_LANGUAGE_KEY = "user:language:{}"
+USER_LANGUAGE_TTL = 24 * 3600
+# Language read during the current update, so rendering one screen reads Redis once
+_update_language: ContextVar[Optional[Tuple[int, str]]] = ContextVar('update_language', default=None)
+
+# The number of requests made today, kept in process memory for a few seconds
+DAILY_REQUESTS_CACHE_TTL = 5
+_daily_requests_cache: Optional[Tuple[date, int, float]] = None
+
+# Failure counters and subscriptions of mailing recipients, written for a whole page at once
+DELIVERY_FAILURES_QUERY = text(
+    "UPDATE users AS u SET delivery_failures = d.failures, is_subscribed = d.subscribed "
+    "FROM unnest(CAST(:chat_ids AS BIGINT[]), CAST(:failures AS INTEGER[]), CAST(:subscribed AS BOOLEAN[])) "
+    "AS d(chat_id, failures, subscribed) "
+    "WHERE u.chat_id = d.chat_id"
+)
+
 
 async def load_keys_to_cache(session: AsyncSession, game_name: str, limit: int = 2000) -> None:
     """Loading keys from the database into the Redis cache."""
     try:
         client = await redis_client.get_client()
 
-        # Load missing keys from the database
-        table_name: str = game_name.replace(" ", "_").lower()
-        query = text(f"SELECT promo_code FROM {table_name} ORDER BY created_at ASC LIMIT :limit")
-        result = await session.execute(query, {'limit': limit})
-        keys: List[str] = [row[0] for row in result.fetchall()]
-
-        if keys:
-            await client.rpush(f"keys:{game_name}", *keys)
-            await client.expire(f"keys:{game_name}", 7200)
-            logger.info(f"✅ {len(keys)} new keys loaded into cache for game: {game_name}")
-        else:
-            logger.info(f"❌ No new keys found in the database for game: {game_name}")
+        # One instance reloads a game at a time, the others use the keys it has loaded
+        lock = client.lock(KEYS_RELOAD_LOCK.format(game_name), timeout=60, blocking_timeout=30)
+        if not await lock.acquire():
+            logger.warning(f"Keys for game {game_name} are being reloaded by another instance")
+            return
+        try:
+            if await client.llen(f"keys:{game_name}") > 0:
+                return
+            await _load_keys(session, client, game_name, limit)
+        finally:
+            await lock.release()
     except Exception as e:
         logger.error(f"Error loading keys to cache for game {game_name}: {e}")
 
 
+async def _load_keys(session: AsyncSession, client, game_name: str, limit: int) -> None:
+    # Keys reserved for users are still in the database until their delivery is confirmed
+    held_key: str = f"keys:held:{game_name}"
+    await client.zremrangebyscore(held_key, '-inf', time.time())
+    held_keys: List[str] = [
+        key.decode('utf-8') if isinstance(key, bytes) else key for key in await client.zrange(held_key, 0, -1)
+    ]
+
+    # Skip the reload when the stock counter says every key left is already reserved
+    keys_stock: Optional[int] = (await get_keys_stock(session, [game_name])).get(game_name)
+    if keys_stock is not None and keys_stock <= len(held_keys):
+        logger.info(f"❌ No new keys in stock for game: {game_name}")
+        return
+
+    # Load missing keys from the database
+    table_name: str = game_name.replace(" ", "_").lower()
+    query = text(
+        f"SELECT promo_code FROM {table_name} WHERE promo_code <> ALL(:held_keys) "
+        f"ORDER BY created_at ASC LIMIT :limit"
+    )
+    result = await session.execute(query, {'held_keys': held_keys, 'limit': limit})
+    keys: List[str] = [row[0] for row in result.fetchall()]
+
+    if keys:
+        await client.rpush(f"keys:{game_name}", *keys)
+        await client.expire(f"keys:{game_name}", 7200)
+        logger.info(f"✅ {len(keys)} new keys loaded into cache for game: {game_name}")
+    else:
+        logger.info(f"❌ No new keys found in the database for game: {game_name}")
+
+
 # Adds new user to the database
-async def get_or_create_user(session: AsyncSession, chat_id: int, user_data: Dict[str, Any]) -> Optional[User]:
+async def get_or_create_user(session: AsyncSession, chat_id: int, user_data: Dict[str, Any]) -> Optional[Row]:
+    """
+    Creating the user or updating the language of an existing one in a single statement.
+    The row is only written when the user is new or their language has changed.
+    """
     try:
-        result = await session.execute(select(User).where(User.chat_id == chat_id))
-        user_record: Optional[User] = result.scalar_one_or_none()
-
-        if user_record is None:
-            new_user = User(**user_data)
-            session.add(new_user)
-            await session.commit()
-            return new_user
+        users = User.__table__
+        insert_stmt = pg_insert(users).values(**user_data)
+        upserted = (
+            insert_stmt.on_conflict_do_update(
+                index_elements=[users.c.chat_id],
+                set_={'language_code': insert_stmt.excluded.language_code},
+                where=users.c.language_code.is_distinct_from(insert_stmt.excluded.language_code),
+            )
+            .returning(*users.c, literal(True).label('changed'))
+            .cte('upserted')
+        )
+        existing = (
+            select(*users.c, literal(False).label('changed'))
+            .where(users.c.chat_id == chat_id, ~exists(select(upserted.c.id)))
+        )
+        result = await session.execute(select(upserted).union_all(existing))
+        user_record: Optional[Row] = result.one_or_none()
+        await session.commit()
 
+        if user_record is not None and user_record.changed:
+            await cache_user_language(user_record.user_id, user_record.language_code)
+            await invalidate_user_profile(user_record.user_id)
         return user_record
     except Exception as e:
         logger.error(f"Error in get_or_create_user for chat_id {chat_id}: {e}")
@@ -58,9 +148,15 @@ async def get_or_create_user(session: AsyncSession, chat_id: int, user_data: Dic
 
 # Get user language
 async def get_user_language(session: AsyncSession, user_id: int) -> str:
+    cached_language: Optional[str] = await get_cached_user_language(user_id)
+    if cached_language:
+        return cached_language
+
     try:
         result = await session.execute(select(User.language_code).filter(User.user_id == user_id))
         user_language: Optional[str] = result.scalar_one_or_none()
+        if user_language:
+            await cache_user_language(user_id, user_language)
         return user_language if user_language else "en"
     except Exception as e:
         logger.error(f"Error in get_user_language: {e}")
@@ -68,14 +164,50 @@ async def get_user_language(session: AsyncSession, user_id: int) -> str:
         return "en"
 
 
+# Returns the cached user language without touching the database
+async def get_cached_user_language(user_id: int) -> Optional[str]:
+    cached: Optional[Tuple[int, str]] = _update_language.get()
+    if cached and cached[0] == user_id:
+        return cached[1]
+
+    try:
+        client = await redis_client.get_client()
+        language_code = await client.get(USER_LANGUAGE_KEY.format(user_id))
+    except Exception as e:
+        logger.error(f"Error reading cached language of user {user_id}: {e}")
+        return None
+
+    if language_code is None:
+        return None
+    language_code = language_code.decode('utf-8') if isinstance(language_code, bytes) else language_code
+    _update_language.set((user_id, language_code))
+    return language_code
+
+
+# Writes the user language through to Redis
+async def cache_user_language(user_id: int, language_code: str) -> None:
+    _update_language.set((user_id, language_code))
+    try:
+        client = await redis_client.get_client()
+        await client.set(USER_LANGUAGE_KEY.format(user_id), language_code, ex=USER_LANGUAGE_TTL)
+    except Exception as e:
+        logger.error(f"Error caching language of user {user_id}: {e}")
+
+
 # Updates user language in the database
 async def update_user_language(session: AsyncSession, user_id: int, language_code: str) -> None:
     try:
-        result = await session.execute(select(User).filter(User.user_id == user_id))
-        user: Optional[User] = result.scalar_one_or_none()
-        if user:
-            user.language_code = language_code
-            await session.commit()
+        result = await session.execute(
+            update(User)
+            .where(User.user_id == user_id)
+            .values(language_code=language_code)
+            .returning(User.user_id)
+        )
+        updated: Optional[int] = result.scalar_one_or_none()
+        await session.commit()
+        if updated is not None:
+            await cache_user_language(user_id, language_code)
+            await invalidate_user_profile(user_id)
     except Exception as e:
         logger.error(f"Error in update_user_language: {e}")
         await session.rollback()
@@ -86,173 +218,173 @@ async def reset_daily_keys_if_needed(session: AsyncSession, user_id: int) -> Non
     try:
         current_date = datetime.now(timezone.utc).date()
 
+        # Only a counter from an earlier day is reset
         result = await session.execute(
-            select(User).filter(User.user_id == user_id)
+            update(User)
+            .where(User.user_id == user_id, User.last_reset_date.is_distinct_from(current_date))
+            .values(daily_requests_count=0, last_reset_date=current_date)
+            .returning(User.user_id)
         )
-        user: Optional[User] = result.scalar_one_or_none()
-        if user and user.last_reset_date != current_date:
-            await session.execute(
-                update(User)
-                .where(User.user_id == user_id)
-                .values(daily_requests_count=0, last_reset_date=current_date)
-            )
-            await session.commit()
+        reset: Optional[int] = result.scalar_one_or_none()
+        await session.commit()
+        if reset is not None:
+            await invalidate_user_profile(user_id)
     except Exception as e:
         logger.error(f"Error in reset_daily_keys_if_needed: {e}")
         await session.rollback()
 
 
 # Logs user action
-async def log_user_action(session: AsyncSession, user_id: int, action: str) -> None:
+async def log_user_action(user_id: int, action: str) -> None:
+    """Buffering the action, it is written to the database by the user log writer"""
     try:
-        new_log = UserLog(user_id=user_id, action=action)
-        session.add(new_log)
-        await session.commit()
+        user_log_writer.write(user_id, action)
     except Exception as e:
         logger.error(f"Error in log_user_action: {e}")
-        await session.rollback()
 
 
-# Getting the oldest keys for the game
-async def get_keys(session: AsyncSession, game_name: str, limit: int = 4) -> List[str]:
-    """Retrieving keys from Redis cache, reloading from the database if necessary."""
+# Moving delivered keys to the issued keys ledger
+async def issue_claimed_keys(
+        session: AsyncSession, issued: Dict[str, List[Tuple[int, str]]], commit: bool = True) -> Dict[str, List[str]]:
+    """
+    Moving delivered keys of several games from the game tables to the issued keys ledger in one transaction.
+    Returns the keys that were moved, keys already moved by an earlier commit are left out.
+    """
+    moved_keys: Dict[str, List[str]] = {}
     try:
-        client = await redis_client.get_client()
-
-        # Get the current number of keys in cache
-        cached_keys_count: int = await client.llen(f"keys:{game_name}")
-
-        # Reload if the number of cached keys falls below the threshold
-        if cached_keys_count <= 0:
-            logger.info(f"Not enough keys ({cached_keys_count}). Reloading new keys for {game_name}.")
-            await load_keys_to_cache(session, game_name, 2000)
-
-        # Retrieve keys without deleting them, to delete them later via delete_keys
-        cached_keys: List[bytes] = await client.lrange(f"keys:{game_name}", 0, limit - 1)
-
-        # Convert bytes to strings (if keys are stored as bytes)
-        cached_keys: List[str] = [key.decode('utf-8') if isinstance(key, bytes) else key for key in cached_keys]
-        if cached_keys:
-            return cached_keys
-        else:
-            logger.error(f"Failed to retrieve keys even after reloading cache for game: {game_name}")
-            return []
+        for game_name, user_keys in issued.items():
+            if not user_keys:
+                continue
+            table_name: str = game_name.replace(" ", "_").lower()
+            query = text(
+                f"WITH moved AS (DELETE FROM {table_name} WHERE promo_code = ANY(:keys) RETURNING promo_code) "
+                f"INSERT INTO issued_keys (user_id, game, promo_code, issued_at) "
+                f"SELECT issued.user_id, :game_name, moved.promo_code, now() FROM moved "
+                f"JOIN unnest(CAST(:user_ids AS BIGINT[]), CAST(:keys AS TEXT[])) AS issued(user_id, promo_code) "
+                f"USING (promo_code) "
+                f"RETURNING promo_code"
+            )
+            result = await session.execute(query, {
+                'game_name': game_name,
+                'user_ids': [user_id for user_id, _ in user_keys],
+                'keys': [key for _, key in user_keys],
+            })
+            moved_keys[game_name] = [row.promo_code for row in result.fetchall()]
+
+        if commit:
+            await session.commit()
+        return moved_keys
     except Exception as e:
-        logger.error(f"Error in get_keys for game {game_name}: {e}")
-        return []
+        logger.error(f"Error in issue_claimed_keys: {e}")
+        await session.rollback()
+        raise
 
 
-# Deleting used keys
-async def delete_keys(session: AsyncSession, game_name: str, keys: List[str]) -> None:
-    """Deleting keys from the database and cache"""
+# Get the users keys of a game were issued to
+async def get_issued_key_owners(session: AsyncSession, game_name: str, keys: List[str]) -> Dict[str, int]:
     try:
-        client = await redis_client.get_client()
-        # Deleting keys from the database
-        table_name: str = game_name.replace(" ", "_").lower()
-        query = text(f"DELETE FROM {table_name} WHERE promo_code = ANY(:keys)")
-        await session.execute(query, {'keys': keys})
-        await session.commit()
-
-        # Deleting keys from the cache
-        for key in keys:
-            await client.lrem(f"keys:{game_name}", 0, key)
+        result = await session.execute(
+            select(IssuedKey.promo_code, IssuedKey.user_id).where(
+                IssuedKey.game == game_name, IssuedKey.promo_code.in_(keys)
+            )
+        )
+        return {row.promo_code: row.user_id for row in result.fetchall()}
     except Exception as e:
-        logger.error(f"Error in delete_keys for game {game_name}: {e}")
-        await session.rollback()
+        logger.error(f"Error in get_issued_key_owners: {e}")
+        raise
 
 
 # Update key count and time of the last request
-async def update_keys_generated(session: AsyncSession, user_id: int, keys_generated: int) -> None:
+async def update_keys_generated(user_id: int, keys_generated: int) -> None:
+    """Counting the request in Redis, the counters are written to the database in batches"""
     # Get the current time in UTC with timezone info
+    current_time = datetime.now(timezone.utc)
     try:
-        current_time = datetime.now(timezone.utc)
-
-        await session.execute(
-            update(User)
-            .where(User.user_id == user_id)
-            .values(
-                total_keys_generated=User.total_keys_generated + keys_generated,
-                daily_requests_count=User.daily_requests_count + 1,
-                last_request_time=current_time,
-                last_reset_date=current_time.date()
+        await user_counters.record_request(user_id, keys_generated, current_time)
+    except Exception as e:
+        logger.error(f"Error in update_keys_generated for user {user_id}, writing to the database: {e}")
+        await write_keys_generated(user_id, keys_generated, current_time)
+        return
+
+    # Write the new counters through to the profile cache
+    profile: Optional[UserProfile] = await get_cached_profile(user_id)
+    if profile:
+        same_day: bool = profile.last_reset_date == current_time.date()
+        await cache_profile(profile._replace(
+            daily_requests_count=profile.daily_requests_count + 1 if same_day else 1,
+            last_reset_date=current_time.date(),
+            last_request_time=current_time,
+        ))
+
+
+# Update key count and time of the last request directly in the database
+async def write_keys_generated(user_id: int, keys_generated: int, current_time: datetime) -> None:
+    try:
+        async with await get_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.user_id == user_id)
+                .values(
+                    total_keys_generated=User.total_keys_generated + keys_generated,
+                    # The daily counter starts over on the first request of a new day
+                    daily_requests_count=case(
+                        (User.last_reset_date == current_time.date(), User.daily_requests_count + 1), else_=1
+                    ),
+                    last_request_time=current_time,
+                    last_reset_date=current_time.date()
+                )
             )
-        )
-        await session.commit()
+            await session.commit()
+        await invalidate_user_profile(user_id)
     except Exception as e:
-        logger.error(f"Error in update_keys_generated for user {user_id}: {e}")
-        await session.rollback()
+        logger.error(f"Error in write_keys_generated for user {user_id}: {e}")
 
 
-# Check user limits
-async def check_user_limits(session: AsyncSession, user_id: int, status_limits: Dict[str, Dict[str, int]]) -> bool:
+# Get the counters of a user that are still waiting to be written to the database
+async def get_pending_counters(user_id: int) -> PendingCounters:
     try:
-        result = await session.execute(
-            select(User.user_status, User.daily_requests_count, User.last_reset_date)
-            .filter(User.user_id == user_id)
-        )
-        user: Optional[User] = result.one_or_none()
+        return await user_counters.get_pending(user_id)
+    except Exception as e:
+        logger.error(f"Error in get_pending_counters for user {user_id}: {e}")
+        return PendingCounters(keys_generated=0, requests_today=0, last_request_time=None)
 
-        if user:
-            current_date = datetime.now(timezone.utc).date()
 
-            # Check if the counter needs to be reset
-            if user.last_reset_date != current_date:
-                await reset_daily_keys_if_needed(session, user_id)
-                daily_requests_count = 0
-            else:
-                daily_requests_count = user.daily_requests_count
+# Get the cached profile of a user, reading it from the database on a miss
+async def get_user_profile(session: AsyncSession, user_id: int) -> Optional[UserProfile]:
+    profile: Optional[UserProfile] = await get_cached_profile(user_id)
+    if profile:
+        return profile
 
-            # Checking limits
-            limit: int = status_limits.get(user.user_status, {}).get('daily_limit', 0)
-            if daily_requests_count >= limit:
-                return False
-        return True
+    try:
+        result = await session.execute(select(*PROFILE_COLUMNS).filter(User.user_id == user_id))
+        row = result.one_or_none()
     except Exception as e:
-        logger.error(f"Error in check_user_limits for user {user_id}: {e}")
-        return False
+        logger.error(f"Error in get_user_profile for user {user_id}: {e}")
+        await session.rollback()
+        return None
+
+    if row is None:
+        return None
+    profile = profile_from_row(row)
+    await cache_profile(profile)
+    return profile
 
 
 # Check for ban, status, user limits
-async def get_user_status_info(session: AsyncSession, user_id: int) -> Optional[User]:
-    try:
-        result = await session.execute(
-            select(
-                User.is_banned,
-                User.last_request_time,
-                User.user_status,
-                User.daily_requests_count,
-                User.last_reset_date,
-            ).filter(User.user_id == user_id)
-        )
-        return result.one_or_none()
-    except Exception as e:
-        logger.error(f"Error in get_user_status_info for user {user_id}: {e}")
-        return None
+async def get_user_status_info(session: AsyncSession, user_id: int) -> Optional[UserProfile]:
+    return await get_user_profile(session, user_id)
 
 
 # Check for ban and role
-async def get_user_role_and_ban_info(session: AsyncSession, user_id: int) -> Optional[User]:
-    try:
-        result = await session.execute(
-            select(User.is_banned, User.user_role).filter(User.user_id == user_id)
-        )
-        return result.one_or_none()
-    except Exception as e:
-        logger.error(f"Error in get_user_role_and_ban_info for user {user_id}: {e}")
-        return None
+async def get_user_role_and_ban_info(session: AsyncSession, user_id: int) -> Optional[UserProfile]:
+    return await get_user_profile(session, user_id)
 
 
 # Check if a user is admin
 async def is_admin(user_id: int) -> bool:
+    """Checking the role against the admin roster, without a database query"""
     try:
-        async with await get_session() as session:
-            user_info = await session.execute(
-                select(User).where(User.user_id == user_id)
-            )
-            user: Optional[User] = user_info.scalars().first()
-            if user and user.user_role == 'admin':
-                return True
-            return False
+        return await admin_roster.is_admin(user_id)
     except Exception as e:
         logger.error(f"Error in is_admin for user {user_id}: {e}")
         return False
@@ -261,27 +393,89 @@ async def is_admin(user_id: int) -> bool:
 # Get admin chat IDs
 async def get_admin_chat_ids() -> List[int]:
     try:
-        async with await get_session() as session:
-            result = await session.execute(
-                select(User.chat_id).where(User.user_role == 'admin')
-            )
-            return [row[0] for row in result.fetchall()]
+        return await admin_roster.get_chat_ids()
     except Exception as e:
         logger.error(f"Error in get_admin_chat_ids: {e}")
         return []
 
 
+# Get the number of keys in stock for every game
+async def get_keys_stock(session: AsyncSession, games: List[str]) -> Dict[str, int]:
+    """
+    Reading the cached stock counters and refreshing them incrementally:
+    only rows added since the last refresh are counted, claims decrement the counters
+    and a full recount runs once per resync interval to correct any drift.
+    Rows inserted by concurrent transactions can commit out of id order, those with an id
+    below the last counted one are only included by the next full recount.
+    """
+    try:
+        client = await redis_client.get_client()
+
+        pipe = client.pipeline(transaction=False)
+        pipe.hmget(KEYS_STOCK, games)
+        pipe.hmget(KEYS_STOCK_LAST_ID, games)
+        pipe.exists(KEYS_STOCK_SYNCED)
+        pipe.mget([f"keys:stock:refreshed:{game}" for game in games])
+        stock, last_ids, synced, refreshed = await pipe.execute()
+
+        stock_counts: Dict[str, Optional[int]] = {
+            game: int(count) if count is not None else None for game, count in zip(games, stock)
+        }
+        full_resync: bool = not synced
+        outdated: List[str] = [
+            game for game, fresh in zip(games, refreshed)
+            if full_resync or fresh is None or stock_counts[game] is None
+        ]
+        if not outdated:
+            return stock_counts
+
+        # Count the new rows of all outdated games in one round trip
+        parts: List[str] = []
+        params: Dict[str, Any] = {}
+        for i, game in enumerate(outdated):
+            table_name: str = game.replace(" ", "_").lower()
+            last_id = last_ids[games.index(game)]
+            recount: bool = full_resync or stock_counts[game] is None or last_id is None
+            parts.append(
+                f"SELECT CAST(:game_{i} AS TEXT) AS game, COUNT(*) AS added, MAX(id) AS last_id "
+                f"FROM {table_name} WHERE id > :last_id_{i}"
+            )
+            params[f"game_{i}"] = game
+            params[f"last_id_{i}"] = 0 if recount else int(last_id)
+        result = await session.execute(text(" UNION ALL ".join(parts)), params)
+
+        pipe = client.pipeline(transaction=True)
+        for row in result.fetchall():
+            if params[f"last_id_{outdated.index(row.game)}"] == 0:
+                stock_counts[row.game] = row.added
+                pipe.hset(KEYS_STOCK, row.game, row.added)
+            else:
+                stock_counts[row.game] += row.added
+                pipe.hincrby(KEYS_STOCK, row.game, row.added)
+            if row.last_id is not None:
+                pipe.hset(KEYS_STOCK_LAST_ID, row.game, row.last_id)
+            pipe.set(f"keys:stock:refreshed:{row.game}", 1, ex=STOCK_REFRESH_INTERVAL)
+        if full_resync:
+            pipe.set(KEYS_STOCK_SYNCED, 1, ex=STOCK_RESYNC_INTERVAL)
+        await pipe.execute()
+
+        return stock_counts
+    except Exception as e:
+        logger.error(f"Error in get_keys_stock: {e}")
+        return {}
+
+
 # Get count games keys in DB
 async def get_keys_count_for_games(session: AsyncSession, games: List[str]) -> str:
     try:
         regular_results: List[str] = ["<i>Quantity</i>....<b>Game</b>\n"]
 
+        keys_stock: Dict[str, int] = await get_keys_stock(session, games)
+        if not keys_stock:
+            raise ValueError("stock counters are unavailable")
+
         for game in games:
-            table_name: str = game.replace(" ", "_").lower()
-            query = text(f"SELECT COUNT(*) FROM {table_name}")
-            result = await session.execute(query)
-            keys_count: int = result.scalar()
-            regular_results.append(f"<i>{keys_count}</i>......<b>{game}</b>")
+            regular_results.append(f"<i>{keys_stock.get(game, 0)}</i>......<b>{game}</b>")
 
         return "\n".join(regular_results)
     except Exception as e:
@@ -322,7 +516,7 @@ async def get_user_details(session: AsyncSession, user_id: int) -> str:
                 User.registration_date, User.language_code,
                 User.is_banned, User.user_status, User.user_role,
                 User.is_subscribed, User.daily_requests_count,
-                User.last_request_time, User.total_keys_generated, User.notes
+                User.last_request_time, User.total_keys_generated, User.notes, User.last_reset_date
             ).filter(User.user_id == user_id)
         )
         user: Optional[User] = result.one_or_none()
@@ -330,6 +524,15 @@ async def get_user_details(session: AsyncSession, user_id: int) -> str:
         if user is None:
             return f"<i>User with ID {user_id} not found.</i>"
 
+        # Requests that are not written to the database yet are added on top
+        pending: PendingCounters = await get_pending_counters(user_id)
+        requests_today: int = pending.requests_today
+        if user.last_reset_date == datetime.now(timezone.utc).date():
+            requests_today += user.daily_requests_count or 0
+        last_request_time: Optional[datetime] = max(
+            filter(None, (user.last_request_time, pending.last_request_time)), default=None
+        )
+
         details: List[str] = [
             f"<b>User Details:</b>\n"
             f"<b>ID</b>: <code>{user.user_id}</code>\n"
@@ -342,10 +545,10 @@ async def get_user_details(session: AsyncSession, user_id: int) -> str:
             f"<b>Status</b>: {user.user_status or '<i>not provided</i>'}\n"
             f"<b>Subscription</b>: {'Active' if user.is_subscribed else 'Inactive'}\n"
             f"<b>Banned</b>: {'Yes' if user.is_banned else 'No'}\n"
-            f"<b>Keys Generated</b>: {user.total_keys_generated}\n"
-            f"<b>Keys Generated Today</b>: {user.daily_requests_count}\n"
+            f"<b>Keys Generated</b>: {(user.total_keys_generated or 0) + pending.keys_generated}\n"
+            f"<b>Keys Generated Today</b>: {requests_today}\n"
             f"<b>Last Request</b>: "
-            f"{user.last_request_time.strftime('%Y-%m-%d %H:%M:%S') if user.last_request_time else 'N/A'}\n"
+            f"{last_request_time.strftime('%Y-%m-%d %H:%M:%S') if last_request_time else 'N/A'}\n"
             f"<b>Notes</b>: {user.notes or 'N/A'}"
         ]
         return "\n".join(details)
@@ -354,16 +557,60 @@ async def get_user_details(session: AsyncSession, user_id: int) -> str:
         return f"<i>Error retrieving details for user {user_id}.</i>"
 
 
-async def get_subscribed_users(session: AsyncSession):
+async def get_subscribed_users(
+        session: AsyncSession,
+        after_chat_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        chat_ids: Optional[List[int]] = None,
+):
+    """Getting subscribed users ordered by chat_id, starting after `after_chat_id` or among `chat_ids`"""
     try:
         stmt = select(
-            User.chat_id, User.first_name, User.is_subscribed).where(User.is_subscribed)
+            User.chat_id, User.first_name, User.language_code, User.is_subscribed, User.delivery_failures
+        ).where(User.is_subscribed).order_by(User.chat_id)
+        if after_chat_id is not None:
+            stmt = stmt.where(User.chat_id > after_chat_id)
+        if chat_ids is not None:
+            stmt = stmt.where(User.chat_id.in_(chat_ids))
+        if limit is not None:
+            stmt = stmt.limit(limit)
         result = await session.execute(stmt)
         users = result.fetchall()
         return users
     except Exception as e:
         logger.error(f"Error in get_subscribed_users: {e}")
-        return []
+        raise
+
+
+# Save the delivery failures of mailing recipients and unsubscribe unreachable ones
+async def update_delivery_failures(session: AsyncSession, failures: Dict[int, int], unsubscribed: List[int]) -> None:
+    """Writing the failure counters and subscriptions of many chats in one statement"""
+    chat_ids: List[int] = list(failures)
+    unsubscribed_chats = set(unsubscribed)
+    try:
+        await session.execute(
+            DELIVERY_FAILURES_QUERY,
+            {
+                'chat_ids': chat_ids,
+                'failures': [failures[chat_id] for chat_id in chat_ids],
+                'subscribed': [chat_id not in unsubscribed_chats for chat_id in chat_ids],
+            }
+        )
+        await session.commit()
+    except Exception as e:
+        logger.error(f"Error in update_delivery_failures: {e}")
+        await session.rollback()
+        raise
+
+
+# Count subscribed users
+async def count_subscribed_users(session: AsyncSession) -> int:
+    try:
+        result = await session.execute(select(func.count()).select_from(User).where(User.is_subscribed))
+        return result.scalar() or 0
+    except Exception as e:
+        logger.error(f"Error in count_subscribed_users: {e}")
+        return 0
 
 
 # Get users list for admin panel
@@ -384,13 +631,23 @@ async def get_keys_count_main_menu(session: AsyncSession, games: List[str]) -> D
 
 # Get daily requests count for regular keys
 async def get_daily_requests_count(session: AsyncSession) -> int:
+    """Reading the daily counter maintained at request time, cached in memory for a few seconds"""
+    global _daily_requests_cache
+    today = datetime.now(timezone.utc).date()
+    if _daily_requests_cache and _daily_requests_cache[0] == today and _daily_requests_cache[2] > time.monotonic():
+        return _daily_requests_cache[1]
+
     try:
-        today = datetime.utcnow().date()
-        result = await session.execute(
-            select(func.sum(func.coalesce(User.daily_requests_count, 0)))
-            .where(User.last_reset_date == today)
-        )
-        return result.scalar() or 0
+        client = await redis_client.get_client()
+        daily_requests_key: str = DAILY_REQUESTS_KEY.format(today.isoformat())
+        count = await client.get(daily_requests_key)
+        if count is None:
+            # No request has been counted today, so the users table holds every request made so far
+            await user_counters.seed_daily_requests(today)
+            count = await client.get(daily_requests_key)
+
+        _daily_requests_cache = (today, int(count), time.monotonic() + DAILY_REQUESTS_CACHE_TTL)
+        return int(count)
     except Exception as e:
         logger.error(f"Error in get_daily_requests_count: {e}")
         return 0
@@ -405,17 +662,22 @@ async def get_user_stats(session: AsyncSession, user_id: int, games: List[str])
                 User.user_status,
                 User.daily_requests_count,
                 User.total_keys_generated,
+                User.last_reset_date,
             ).filter(User.user_id == user_id)
         )
         user_data = result.fetchone()
         if not user_data:
             raise KeyError(f"User with ID {user_id} not found or missing data.")
-        keys_today: int = user_data[2] * (len(games) * 4 + 4)
+
+        # Requests that are not written to the database yet are added on top
+        pending: PendingCounters = await get_pending_counters(user_id)
+        requests_today: int = (user_data[2] or 0) if user_data[4] == datetime.now(timezone.utc).date() else 0
+        keys_today: int = (requests_today + pending.requests_today) * (len(games) * 4 + 4)
         return {
             "registration_date": user_data[0],
             "user_status": user_data[1],
             "keys_today": keys_today,
-            "total_keys_generated": user_data[3],
+            "total_keys_generated": (user_data[3] or 0) + pending.keys_generated,
         }
     except KeyError as e:
         logger.error(f"KeyError in get_user_stats: {e}")
@@ -0,0 +1,436 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from bot.bot_config import logger
+from config.redis_config import redis_manager as redis_client
+from db.database import get_session
+
+from .db_service import KEYS_STOCK, get_issued_key_owners, issue_claimed_keys, load_keys_to_cache
+
+# Returns the keys of a reservation to the head of their game lists, unless they were delivered
+RETURN_RESERVATION_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[3], ARGV[1]) == 1 then
+    return 0
+end
+local fields = redis.call('HGETALL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+if #fields == 0 then
+    return 0
+end
+for i = 1, #fields, 2 do
+    local keys = cjson.decode(fields[i + 1])
+    for j = #keys, 1, -1 do
+        redis.call('LPUSH', 'keys:' .. fields[i], keys[j])
+    end
+    if #keys > 0 then
+        redis.call('ZREM', 'keys:held:' .. fields[i], unpack(keys))
+    end
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+RESERVATIONS_KEY = "keys:reservations"
+# Reservations whose keys reached the user but aren't in the issued keys ledger yet
+DELIVERED_KEY = "keys:reservations:delivered"
+# Keys that were sent to more than one user, "<game>:<key>" -> the user whose delivery was confirmed late
+DOUBLE_ISSUED_KEY = "keys:double_issued"
+
+
+class ContestedKey(NamedTuple):
+    """A delivered key that was no longer in the pool when its expired reservation was committed"""
+    user_id: int
+    game: str
+    key: str
+    # Another reservation holds the key
+    held: bool
+
+
+class KeyReservation(NamedTuple):
+    reservation_id: str
+    user_id: int
+    keys: Dict[str, List[str]]
+
+
+QueueItem = Tuple[str, Any, asyncio.Future]
+
+
+class KeyClaimService:
+    """
+    Coalesces concurrent key claims into one batched Redis and database operation.
+    Claimed keys are only reserved: they are moved to the issued keys ledger once the user
+    has received them, and reservations that are never committed go back to the pool.
+    """
+
+    def __init__(
+            self,
+            batch_window: float = 0.02,
+            max_batch_size: int = 200,
+            # Far longer than a send can take: the rate governor waits out up to four flood limits
+            # of a minute each, and every request can take a minute before it times out
+            reservation_ttl: int = 900,
+            sweep_interval: float = 5.0,
+            commit_attempts: int = 3,
+    ) -> None:
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.reservation_ttl = reservation_ttl
+        self.sweep_interval = sweep_interval
+        self.commit_attempts = commit_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping: bool = False
+        self._return_script = None
+
+    def start(self) -> None:
+        """Starting the background worker that flushes collected requests"""
+        if self._worker and not self._worker.done():
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info("✅ Key claim service started")
+
+    async def stop(self) -> None:
+        """Flushing the queued requests and stopping the worker"""
+        self._stopping = True
+        if self._worker and not self._worker.done():
+            await self._queue.put(("stop", None, None))
+            await self._worker
+        self._worker = None
+        # Requests queued behind the stop request are never processed
+        while self._queue is not None and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError("Key claim service is stopped"))
+        logger.info("📁 Key claim service stopped")
+
+    async def claim(self, user_id: int, games: List[str], limit: int = 4) -> KeyReservation:
+        """Reserving up to `limit` keys for every game, shared with concurrent requests"""
+        return await self._submit("claim", (user_id, games, limit))
+
+    async def commit(self, reservation: KeyReservation) -> None:
+        """Confirming the delivery of reserved keys and moving them to the issued keys ledger"""
+        if any(reservation.keys.values()):
+            await self._submit("commit", reservation)
+
+    async def release(self, reservation: KeyReservation) -> None:
+        """Returning undelivered keys to the head of the inventory"""
+        if any(reservation.keys.values()):
+            await self._submit("release", reservation)
+
+    async def _submit(self, action: str, payload: Any) -> Any:
+        if self._stopping:
+            raise RuntimeError("Key claim service is stopping")
+        self.start()
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((action, payload, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_sweep: float = loop.time() + self.sweep_interval
+        stopping: bool = False
+
+        while not stopping:
+            batch: List[QueueItem] = await self._collect_batch(max(next_sweep - loop.time(), 0))
+            stopping = any(action == "stop" for action, _, _ in batch)
+
+            # Returned keys go back to the pool before the claims of the same batch are served
+            await self._process(self._release_batch, [item for item in batch if item[0] == "release"])
+            await self._process(self._commit_batch, [item for item in batch if item[0] == "commit"])
+            await self._process(self._claim_batch, [item for item in batch if item[0] == "claim"])
+
+            if loop.time() >= next_sweep:
+                try:
+                    await self._sweep_expired()
+                except Exception as e:
+                    logger.error(f"Error returning expired key reservations: {e}")
+                next_sweep = loop.time() + self.sweep_interval
+
+    async def _collect_batch(self, timeout: float) -> List[QueueItem]:
+        """Waiting for the first request and collecting those that arrive during the batch window"""
+        loop = asyncio.get_running_loop()
+        try:
+            batch: List[QueueItem] = [await asyncio.wait_for(self._queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        deadline: float = loop.time() + self.batch_window
+
+        while len(batch) < self.max_batch_size and batch[-1][0] != "stop":
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    async def _process(handler, items: List[QueueItem]) -> None:
+        if not items:
+            return
+        try:
+            results: List[Any] = await handler([payload for _, payload, _ in items])
+        except Exception as e:
+            logger.error(f"Error in {handler.__name__} for {len(items)} requests: {e}")
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _claim_batch(self, requests: List[Tuple[int, List[str], int]]) -> List[KeyReservation]:
+        """Popping the keys for the whole batch and recording them as reservations"""
+        demand: Dict[str, int] = {}
+        for _, games, limit in requests:
+            for game in games:
+                demand[game] = demand.get(game, 0) + limit
+
+        client = await redis_client.get_client()
+        claimed: Dict[str, List[str]] = await self._pop_keys(client, demand)
+
+        # Games whose cache ran dry are refilled, reserved keys are skipped by the reload
+        missing: Dict[str, int] = {
+            game: count - len(claimed[game]) for game, count in demand.items() if len(claimed[game]) < count
+        }
+        if missing:
+            await self._hold_keys(client, claimed)
+            async with await get_session() as session:
+                for game in missing:
+                    logger.info(f"Not enough keys in cache. Reloading new keys for {game}.")
+                    await load_keys_to_cache(session, game, 2000)
+
+            for game, keys in (await self._pop_keys(client, missing)).items():
+                claimed[game].extend(keys)
+
+        # Hand the keys out in the order the requests arrived
+        reservations: List[KeyReservation] = []
+        offsets: Dict[str, int] = {game: 0 for game in demand}
+        for user_id, games, limit in requests:
+            keys: Dict[str, List[str]] = {}
+            for game in games:
+                start: int = offsets[game]
+                keys[game] = claimed[game][start:start + limit]
+                offsets[game] = start + len(keys[game])
+            reservations.append(KeyReservation(f"{user_id}:{uuid.uuid4().hex}", user_id, keys))
+
+        await self._store_reservations(client, claimed, reservations)
+        return reservations
+
+    async def _store_reservations(
+            self, client, claimed: Dict[str, List[str]], reservations: List[KeyReservation]) -> None:
+        expires_at: float = time.time() + self.reservation_ttl
+
+        pipe = client.pipeline(transaction=True)
+        for reservation in reservations:
+            if not any(reservation.keys.values()):
+                continue
+            pipe.hset(
+                f"keys:reservation:{reservation.reservation_id}",
+                mapping={game: json.dumps(keys) for game, keys in reservation.keys.items() if keys},
+            )
+            pipe.zadd(RESERVATIONS_KEY, {reservation.reservation_id: expires_at})
+        await pipe.execute()
+        await self._hold_keys(client, claimed, expires_at)
+
+    async def _hold_keys(self, client, claimed: Dict[str, List[str]], expires_at: Optional[float] = None) -> None:
+        """Marking keys that are still in the database as unavailable for cache reloads"""
+        # The grace period covers the time it takes to commit or return an expired reservation
+        hold_until: float = (expires_at or time.time() + self.reservation_ttl) + self.reservation_ttl
+        pipe = client.pipeline(transaction=False)
+        for game, keys in claimed.items():
+            if keys:
+                pipe.zadd(f"keys:held:{game}", {key: hold_until for key in keys})
+        await pipe.execute()
+
+    async def _commit_batch(self, reservations: List[KeyReservation]) -> List[None]:
+        """Moving delivered keys to the issued keys ledger and closing their reservations"""
+        delivered: Dict[str, List[Tuple[int, str]]] = {}
+        for reservation in reservations:
+            for game, keys in reservation.keys.items():
+                delivered.setdefault(game, []).extend((reservation.user_id, key) for key in keys)
+
+        # Delivered reservations are never returned to the pool, even if writing the ledger fails
+        client = await redis_client.get_client()
+        pipe = client.pipeline(transaction=True)
+        pipe.sadd(DELIVERED_KEY, *[reservation.reservation_id for reservation in reservations])
+        for reservation in reservations:
+            pipe.exists(f"keys:reservation:{reservation.reservation_id}")
+        results: List[int] = (await pipe.execute())[1:]
+        contested: List[ContestedKey] = await self._take_back_returned(client, [
+            reservation for reservation, exists in zip(reservations, results) if not exists
+        ])
+
+        issued: Dict[str, List[str]] = await self._write_ledger(delivered)
+        if contested:
+            await self._flag_double_issues(client, contested, issued)
+
+        # Moving keys to the ledger is idempotent, the reservations are closed only once it is written
+        pipe = client.pipeline(transaction=True)
+        for reservation in reservations:
+            pipe.delete(f"keys:reservation:{reservation.reservation_id}")
+            pipe.zrem(RESERVATIONS_KEY, reservation.reservation_id)
+        pipe.srem(DELIVERED_KEY, *[reservation.reservation_id for reservation in reservations])
+        for game, user_keys in delivered.items():
+            if user_keys:
+                pipe.zrem(f"keys:held:{game}", *[key for _, key in user_keys])
+            # Only rows this commit deleted leave the stock, a replayed commit deletes none
+            if issued.get(game):
+                pipe.hincrby(KEYS_STOCK, game, -len(issued[game]))
+        await pipe.execute()
+
+        return [None] * len(reservations)
+
+    async def _take_back_returned(self, client, reservations: List[KeyReservation]) -> List[ContestedKey]:
+        """
+        Removing delivered keys from the pool, their reservations expired before delivery was confirmed.
+        Returns the keys that had already left the pool again, they may have been claimed by another user.
+        """
+        if not reservations:
+            return []
+        hold_until: float = time.time() + self.reservation_ttl
+        taken: List[Tuple[int, str, str]] = []
+        pipe = client.pipeline(transaction=True)
+        for reservation in reservations:
+            logger.warning(f"Reservation {reservation.reservation_id} expired before commit")
+            for game, keys in reservation.keys.items():
+                for key in keys:
+                    taken.append((reservation.user_id, game, key))
+                    pipe.lrem(f"keys:{game}", 0, key)
+                    pipe.zscore(f"keys:held:{game}", key)
+                    # Cache reloads skip the key until the ledger is written, another reservation's hold is kept
+                    pipe.zadd(f"keys:held:{game}", {key: hold_until}, nx=True)
+        results: List = await pipe.execute()
+
+        return [
+            ContestedKey(user_id, game, key, results[3 * i + 1] is not None)
+            for i, (user_id, game, key) in enumerate(taken) if not results[3 * i]
+        ]
+
+    @staticmethod
+    async def _flag_double_issues(
+            client, contested: List[ContestedKey], issued: Dict[str, List[str]]) -> None:
+        """Recording keys that another user was sent as well, so the admins can look into them"""
+        # A key held by another reservation is being sent to its user, one that this commit didn't move
+        # to the ledger may have been issued to someone else; the rest were only missing from the cache
+        not_moved: Dict[str, List[str]] = {}
+        for item in contested:
+            if not item.held and item.key not in issued.get(item.game, []):
+                not_moved.setdefault(item.game, []).append(item.key)
+        owners: Dict[Tuple[str, str], int] = {}
+        if not_moved:
+            async with await get_session() as session:
+                for game, keys in not_moved.items():
+                    for key, user_id in (await get_issued_key_owners(session, game, keys)).items():
+                        owners[(game, key)] = user_id
+
+        # A key already in the ledger for the same user comes from a commit that was replayed
+        double_issued: List[ContestedKey] = [
+            item for item in contested
+            if item.held or owners.get((item.game, item.key), item.user_id) != item.user_id
+        ]
+        if not double_issued:
+            return
+        await client.hset(DOUBLE_ISSUED_KEY, mapping={
+            f"{item.game}:{item.key}": item.user_id for item in double_issued
+        })
+        logger.error(
+            f"{len(double_issued)} keys were sent to two users after their reservations expired: "
+            + ", ".join(f"{item.game} {item.key} (user {item.user_id})" for item in double_issued)
+        )
+
+    async def _write_ledger(self, delivered: Dict[str, List[Tuple[int, str]]]) -> Dict[str, List[str]]:
+        """Writing the issued keys, retried a few times before the sweeper takes over"""
+        for attempt in range(1, self.commit_attempts + 1):
+            try:
+                async with await get_session() as session:
+                    return await issue_claimed_keys(session, delivered)
+            except Exception as e:
+                if attempt == self.commit_attempts:
+                    raise
+                logger.warning(f"Error writing issued keys, attempt {attempt}: {e}")
+                await asyncio.sleep(0.5 * attempt)
+
+    async def _release_batch(self, reservations: List[KeyReservation]) -> List[None]:
+        await self._return_reservations([reservation.reservation_id for reservation in reservations])
+        return [None] * len(reservations)
+
+    async def _sweep_expired(self) -> None:
+        """Returning the keys of reservations whose delivery was never confirmed"""
+        client = await redis_client.get_client()
+        expired: List[bytes] = await client.zrangebyscore(RESERVATIONS_KEY, '-inf', time.time(), start=0, num=500)
+        if not expired:
+            return
+        reservation_ids: List[str] = [
+            reservation_id.decode('utf-8') if isinstance(reservation_id, bytes) else reservation_id
+            for reservation_id in expired
+        ]
+        delivered_flags: List[int] = await client.smismember(DELIVERED_KEY, reservation_ids)
+
+        # Delivered keys whose ledger write failed are written again instead of being returned
+        delivered: List[str] = [
+            reservation_id for reservation_id, flag in zip(reservation_ids, delivered_flags) if flag
+        ]
+        if delivered:
+            await self._commit_batch(await self._load_reservations(client, delivered))
+            logger.info(f"Wrote {len(delivered)} delivered key reservations to the ledger")
+
+        undelivered: List[str] = [
+            reservation_id for reservation_id, flag in zip(reservation_ids, delivered_flags) if not flag
+        ]
+        if undelivered:
+            await self._return_reservations(undelivered)
+            logger.info(f"Returned {len(undelivered)} expired key reservations to the pool")
+
+    @staticmethod
+    async def _load_reservations(client, reservation_ids: List[str]) -> List[KeyReservation]:
+        pipe = client.pipeline(transaction=False)
+        for reservation_id in reservation_ids:
+            pipe.hgetall(f"keys:reservation:{reservation_id}")
+        stored: List[Dict] = await pipe.execute()
+
+        reservations: List[KeyReservation] = []
+        for reservation_id, fields in zip(reservation_ids, stored):
+            keys: Dict[str, List[str]] = {
+                (game.decode('utf-8') if isinstance(game, bytes) else game): json.loads(value)
+                for game, value in fields.items()
+            }
+            reservations.append(KeyReservation(reservation_id, int(reservation_id.split(':')[0]), keys))
+        return reservations
+
+    async def _return_reservations(self, reservation_ids: List[str]) -> None:
+        client = await redis_client.get_client()
+        if self._return_script is None:
+            self._return_script = client.register_script(RETURN_RESERVATION_SCRIPT)
+
+        pipe = client.pipeline(transaction=False)
+        for reservation_id in reservation_ids:
+            await self._return_script(
+                keys=[f"keys:reservation:{reservation_id}", RESERVATIONS_KEY, DELIVERED_KEY],
+                args=[reservation_id],
+                client=pipe,
+            )
+        await pipe.execute()
+
+    @staticmethod
+    async def _pop_keys(client, demand: Dict[str, int]) -> Dict[str, List[str]]:
+        pipe = client.pipeline(transaction=False)
+        for game, count in demand.items():
+            pipe.lpop(f"keys:{game}", count)
+        popped = await pipe.execute()
+
+        return {
+            game: [key.decode('utf-8') if isinstance(key, bytes) else key for key in (keys or [])]
+            for game, keys in zip(demand, popped)
+        }
+
+
+key_claim_service = KeyClaimService()
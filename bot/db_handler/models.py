@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Boolean, Column, Date, DateTime, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, Date, DateTime, Identity, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -24,6 +24,8 @@ class User(Base):
     referral_code = Column(String(50))
     referred_by = Column(String(50))
     is_subscribed = Column(Boolean, default=True)
+    # Mailings in a row that couldn't be delivered to the chat
+    delivery_failures = Column(Integer, default=0, server_default='0', nullable=False)
     daily_requests_count = Column(Integer, default=0)
     last_reset_date = Column(Date, default=datetime.utcnow().date)
     last_request_time = Column(DateTime(timezone=True))
@@ -33,8 +35,29 @@ class User(Base):
 
 class UserLog(Base):
     __tablename__ = 'user_logs'
+    __table_args__ = (
+        Index('ix_user_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id = Column(Integer, primary_key=True)
+    # The partition key has to be part of the primary key
+    id = Column(BigInteger, Identity(), primary_key=True)
     user_id = Column(BigInteger, nullable=False)
     action = Column(Text)
-    timestamp = Column(DateTime(timezone=True), default=datetime.utcnow)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, default=datetime.utcnow)
+
+
+class IssuedKey(Base):
+    __tablename__ = 'issued_keys'
+    __table_args__ = (
+        Index('ix_issued_keys_user_id_issued_at', 'user_id', 'issued_at'),
+        Index('ix_issued_keys_promo_code', 'promo_code'),
+        {'postgresql_partition_by': 'RANGE (issued_at)'},
+    )
+
+    # The partition key has to be part of the primary key
+    id = Column(BigInteger, Identity(), primary_key=True)
+    issued_at = Column(DateTime(timezone=True), primary_key=True, default=datetime.utcnow)
+    user_id = Column(BigInteger, nullable=False)
+    game = Column(String(50), nullable=False)
+    promo_code = Column(Text, nullable=False)
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.bot_config import ISSUED_KEYS_RETENTION_MONTHS, USER_LOGS_RETENTION_MONTHS, logger
+from db.database import get_session
+
+
+def _add_months(month: date, months: int) -> date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, month_index + 1, 1)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_y{month:%Y}m{month:%m}"
+
+
+# Creates the monthly partitions for the current month and the months ahead
+async def ensure_monthly_partitions(session: AsyncSession, table_name: str, months_ahead: int = 2) -> None:
+    current_month: date = datetime.now(timezone.utc).date().replace(day=1)
+
+    for offset in range(months_ahead + 1):
+        month: date = _add_months(current_month, offset)
+        # Months start at midnight UTC whatever the session time zone is
+        await session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{month} 00:00+00') TO ('{_add_months(month, 1)} 00:00+00')"
+        ))
+    await session.commit()
+
+
+# Drops the monthly partitions that are older than the retention period
+async def drop_expired_partitions(session: AsyncSession, table_name: str, retention_months: int) -> List[str]:
+    cutoff: date = _add_months(datetime.now(timezone.utc).date().replace(day=1), -retention_months)
+
+    result = await session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table_name"
+    ), {'table_name': table_name})
+
+    dropped: List[str] = []
+    for name in sorted(row[0] for row in result.fetchall()):
+        suffix: str = name[len(table_name):]
+        try:
+            month: date = datetime.strptime(suffix, "_y%Ym%m").date()
+        except ValueError:
+            continue
+        if _add_months(month, 1) <= cutoff:
+            await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+
+    await session.commit()
+    return dropped
+
+
+class PartitionMaintenance:
+    """Keeps the monthly partitions of history tables created ahead of time and applies their retention."""
+
+    def __init__(self, retention: Dict[str, int], interval: int = 6 * 3600) -> None:
+        self.retention = retention
+        self.interval = interval
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._worker and not self._worker.done():
+            return
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def run_once(self) -> None:
+        for table_name, retention_months in self.retention.items():
+            try:
+                async with await get_session() as session:
+                    await ensure_monthly_partitions(session, table_name)
+                    dropped: List[str] = await drop_expired_partitions(session, table_name, retention_months)
+                if dropped:
+                    logger.info(f"📁 Dropped expired partitions of {table_name}: {', '.join(dropped)}")
+            except Exception as e:
+                logger.error(f"Error maintaining partitions of {table_name}: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+
+partition_maintenance = PartitionMaintenance({
+    'issued_keys': ISSUED_KEYS_RETENTION_MONTHS,
+    'user_logs': USER_LOGS_RETENTION_MONTHS,
+})
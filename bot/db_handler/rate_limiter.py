@@ -0,0 +1,124 @@
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from bot.bot_config import logger
+from bot.utils.static_data import STATUS_LIMITS
+from config.redis_config import redis_manager as redis_client
+
+from .user_profile_cache import UserProfile
+
+# Checks the daily quota and the cooldown and takes a request slot in one step.
+# KEYS: daily counter, cooldown. ARGV: daily limit, cooldown ms, counter ttl,
+# requests already made today and cooldown left in ms, used when the keys don't exist yet.
+# Returns {0, requests made today} when allowed, {1, 0} when the daily limit is reached,
+# {2, ms to wait} while the cooldown lasts.
+ACQUIRE_SCRIPT = """
+local daily_limit = tonumber(ARGV[1])
+local cooldown_ms = tonumber(ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[4], 'EX', ARGV[3])
+    if tonumber(ARGV[5]) > 0 then
+        redis.call('SET', KEYS[2], 1, 'PX', ARGV[5], 'NX')
+    end
+end
+local used = tonumber(redis.call('GET', KEYS[1]))
+if used >= daily_limit then
+    return {1, 0}
+end
+local wait = redis.call('PTTL', KEYS[2])
+if wait > 0 then
+    return {2, wait}
+end
+used = redis.call('INCR', KEYS[1])
+if cooldown_ms > 0 then
+    redis.call('SET', KEYS[2], 1, 'PX', cooldown_ms)
+end
+return {0, used}
+"""
+
+# Gives a request slot back when nothing was handed out
+REFUND_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    redis.call('DECR', KEYS[1])
+end
+redis.call('DEL', KEYS[2])
+return 1
+"""
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    daily_limit_reached: bool
+    wait_seconds: int
+
+
+class RateLimiter:
+    """Enforces the daily quota and the interval between requests from STATUS_LIMITS in Redis"""
+
+    def __init__(self, status_limits: Dict[str, Dict[str, int]]) -> None:
+        self.status_limits = status_limits
+        self._acquire_script = None
+        self._refund_script = None
+
+    @staticmethod
+    def _keys(user_id: int, today: date) -> List[str]:
+        return [f"limits:daily:{user_id}:{today.isoformat()}", f"limits:cooldown:{user_id}"]
+
+    async def acquire(self, user_id: int, profile: Optional[UserProfile]) -> RateLimitResult:
+        """
+        Taking a request slot if the user is within the limits of their status.
+        The counters of the profile seed Redis when the limiter has no state for the user yet.
+        """
+        limits: Dict[str, int] = self.status_limits.get(profile.user_status if profile else 'free', {})
+        daily_limit: int = limits.get('daily_limit', 0)
+        cooldown_ms: int = limits.get('interval_minutes', 0) * 60 * 1000
+
+        now = datetime.now(timezone.utc)
+        # Counters outlive the day they count by an hour
+        next_day = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+        counter_ttl: int = int((next_day - now).total_seconds()) + 3600
+
+        used_today: int = 0
+        cooldown_left_ms: int = 0
+        if profile:
+            if profile.last_reset_date == now.date():
+                used_today = profile.daily_requests_count
+            if profile.last_request_time and cooldown_ms:
+                elapsed_ms: float = (now - profile.last_request_time).total_seconds() * 1000
+                cooldown_left_ms = max(int(cooldown_ms - elapsed_ms), 0)
+
+        try:
+            client = await redis_client.get_client()
+            if self._acquire_script is None:
+                self._acquire_script = client.register_script(ACQUIRE_SCRIPT)
+            status, value = await self._acquire_script(
+                keys=self._keys(user_id, now.date()),
+                args=[daily_limit, cooldown_ms, counter_ttl, used_today, cooldown_left_ms],
+            )
+        except Exception as e:
+            # Without Redis the limits are checked against the counters of the profile
+            logger.error(f"Error in rate limiter for user {user_id}, checking the profile instead: {e}")
+            if used_today >= daily_limit:
+                status, value = 1, 0
+            else:
+                status, value = (2, cooldown_left_ms) if cooldown_left_ms > 0 else (0, 0)
+
+        if status == 1:
+            return RateLimitResult(allowed=False, daily_limit_reached=True, wait_seconds=0)
+        if status == 2:
+            return RateLimitResult(allowed=False, daily_limit_reached=False, wait_seconds=math.ceil(value / 1000))
+        return RateLimitResult(allowed=True, daily_limit_reached=False, wait_seconds=0)
+
+    async def refund(self, user_id: int) -> None:
+        """Returning the slot taken by a request that handed out nothing"""
+        try:
+            client = await redis_client.get_client()
+            if self._refund_script is None:
+                self._refund_script = client.register_script(REFUND_SCRIPT)
+            await self._refund_script(keys=self._keys(user_id, datetime.now(timezone.utc).date()))
+        except Exception as e:
+            logger.error(f"Error refunding the request slot of user {user_id}: {e}")
+
+
+rate_limiter = RateLimiter(STATUS_LIMITS)
@@ -0,0 +1,34 @@
+from typing import Dict, Optional
+
+from bot.bot_config import logger
+from config.redis_config import redis_manager as redis_client
+
+# User whose message was forwarded as this message of an admin chat
+REPLY_ROUTE_KEY = "support:reply:{}:{}"
+# Admins can reply to a forwarded message for this long
+REPLY_ROUTE_TTL = 7 * 24 * 3600
+
+
+async def save_reply_routes(user_id: int, forwarded: Dict[int, int]) -> None:
+    """Remembering the user behind the copies of their message forwarded to admin chats"""
+    if not forwarded:
+        return
+    try:
+        client = await redis_client.get_client()
+        pipe = client.pipeline(transaction=False)
+        for chat_id, message_id in forwarded.items():
+            pipe.set(REPLY_ROUTE_KEY.format(chat_id, message_id), user_id, ex=REPLY_ROUTE_TTL)
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error saving reply routes for user {user_id}: {e}")
+
+
+async def get_reply_route(chat_id: int, message_id: int) -> Optional[int]:
+    """Getting the user an admin reply to a forwarded message should go to"""
+    try:
+        client = await redis_client.get_client()
+        user_id = await client.get(REPLY_ROUTE_KEY.format(chat_id, message_id))
+        return int(user_id) if user_id is not None else None
+    except Exception as e:
+        logger.error(f"Error reading reply route of message {message_id} in chat {chat_id}: {e}")
+        return None
@@ -0,0 +1,249 @@
+import asyncio
+from datetime import date, datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from redis.exceptions import LockNotOwnedError
+from sqlalchemy import text
+
+from bot.bot_config import logger
+from config.redis_config import redis_manager as redis_client
+from db.database import get_session, session_scope
+
+PENDING_USERS = "users:counters:pending"
+FLUSHING_USERS = "users:counters:flushing"
+FLUSH_LOCK = "users:counters:flush_lock"
+# The lock is extended while a flush runs, so it only expires when the flushing instance is gone
+FLUSH_LOCK_TIMEOUT = 60
+# Successful requests of all users per UTC day, shown on the main menu
+DAILY_REQUESTS_KEY = "stats:requests:{}"
+DAILY_REQUESTS_TTL = 2 * 24 * 3600
+
+# Counts a request in the daily counter if it has been seeded, returns nil otherwise
+INCR_DAILY_REQUESTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local count = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return count
+"""
+
+DAILY_REQUESTS_QUERY = text(
+    "SELECT COALESCE(SUM(COALESCE(daily_requests_count, 0)), 0) FROM users WHERE last_reset_date = :day"
+)
+
+# Moves the pending counters of up to ARGV[1] users to their flushing hashes,
+# merging them with counters left there by a flush that failed
+CLAIM_PENDING_SCRIPT = """
+local user_ids = redis.call('SPOP', KEYS[1], ARGV[1])
+for _, user_id in ipairs(user_ids) do
+    local pending_key = 'users:counters:pending:' .. user_id
+    local flushing_key = 'users:counters:flushing:' .. user_id
+    local fields = redis.call('HGETALL', pending_key)
+    for i = 1, #fields, 2 do
+        if fields[i] == 'last_request_time' then
+            local current = tonumber(redis.call('HGET', flushing_key, 'last_request_time') or '0')
+            if tonumber(fields[i + 1]) > current then
+                redis.call('HSET', flushing_key, 'last_request_time', fields[i + 1])
+            end
+        else
+            redis.call('HINCRBY', flushing_key, fields[i], fields[i + 1])
+        end
+    end
+    redis.call('DEL', pending_key)
+    redis.call('SADD', KEYS[2], user_id)
+end
+return #user_ids
+"""
+
+FLUSH_QUERY = text(
+    "UPDATE users AS u SET "
+    "total_keys_generated = COALESCE(u.total_keys_generated, 0) + d.keys, "
+    "daily_requests_count = CASE WHEN u.last_reset_date = d.day "
+    "THEN COALESCE(u.daily_requests_count, 0) + d.requests ELSE d.requests END, "
+    "last_reset_date = d.day, "
+    "last_request_time = GREATEST(u.last_request_time, d.last_request_time) "
+    "FROM unnest(CAST(:user_ids AS BIGINT[]), CAST(:keys AS INTEGER[]), CAST(:requests AS INTEGER[]), "
+    "CAST(:days AS DATE[]), CAST(:times AS TIMESTAMPTZ[])) AS d(user_id, keys, requests, day, last_request_time) "
+    "WHERE u.user_id = d.user_id"
+)
+
+
+class PendingCounters(NamedTuple):
+    keys_generated: int
+    requests_today: int
+    last_request_time: Optional[datetime]
+
+
+class UserCounters:
+    """
+    Keeps the per-request user counters in Redis and writes them to `users` in batched
+    updates, so a request doesn't create a new version of the user row.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, batch_size: int = 500) -> None:
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._worker: Optional[asyncio.Task] = None
+        self._claim_script = None
+        self._incr_daily_script = None
+
+    def start(self) -> None:
+        if self._worker and not self._worker.done():
+            return
+        self._worker = asyncio.create_task(self._run())
+        logger.info("✅ User counters writer started")
+
+    async def stop(self) -> None:
+        """Stopping the worker and writing every pending counter"""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while await self.flush():
+            pass
+        logger.info("📁 User counters writer stopped")
+
+    async def record_request(self, user_id: int, keys_generated: int, request_time: datetime) -> None:
+        """Counting a successful request of the user"""
+        client = await redis_client.get_client()
+        pending_key: str = f"users:counters:pending:{user_id}"
+
+        # The daily counter is seeded from the users table before the first request of the day is added,
+        # and before this request can be flushed there
+        if self._incr_daily_script is None:
+            self._incr_daily_script = client.register_script(INCR_DAILY_REQUESTS_SCRIPT)
+        daily_requests_key: str = DAILY_REQUESTS_KEY.format(request_time.date().isoformat())
+        if await self._incr_daily_script(keys=[daily_requests_key], args=[DAILY_REQUESTS_TTL]) is None:
+            await self.seed_daily_requests(request_time.date())
+            await client.incr(daily_requests_key)
+
+        pipe = client.pipeline(transaction=True)
+        pipe.hincrby(pending_key, 'keys', keys_generated)
+        pipe.hincrby(pending_key, f"requests:{request_time.date().isoformat()}", 1)
+        pipe.hset(pending_key, 'last_request_time', request_time.timestamp())
+        pipe.sadd(PENDING_USERS, user_id)
+        await pipe.execute()
+
+    @staticmethod
+    async def seed_daily_requests(day: date) -> None:
+        """Starting the daily counter from the requests already written to the users table"""
+        async with session_scope() as session:
+            count: int = (await session.execute(DAILY_REQUESTS_QUERY, {'day': day})).scalar() or 0
+        client = await redis_client.get_client()
+        await client.set(DAILY_REQUESTS_KEY.format(day.isoformat()), count, ex=DAILY_REQUESTS_TTL, nx=True)
+
+    async def get_pending(self, user_id: int) -> PendingCounters:
+        """Getting the counters of the user that are not in the database yet"""
+        client = await redis_client.get_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.hgetall(f"users:counters:pending:{user_id}")
+        pipe.hgetall(f"users:counters:flushing:{user_id}")
+
+        today: str = datetime.now(timezone.utc).date().isoformat()
+        keys_generated: int = 0
+        requests_today: int = 0
+        last_request_time: float = 0
+        for counters in await pipe.execute():
+            counters = self._decode(counters)
+            keys_generated += int(counters.get('keys', 0))
+            requests_today += int(counters.get(f"requests:{today}", 0))
+            last_request_time = max(last_request_time, float(counters.get('last_request_time', 0)))
+
+        return PendingCounters(
+            keys_generated=keys_generated,
+            requests_today=requests_today,
+            last_request_time=datetime.fromtimestamp(last_request_time, timezone.utc) if last_request_time else None,
+        )
+
+    async def flush(self) -> bool:
+        """Writing one batch of counters to the database, returns True if there may be more to write"""
+        client = await redis_client.get_client()
+        # Only one instance flushes at a time, so a batch is never written twice
+        lock = client.lock(FLUSH_LOCK, timeout=FLUSH_LOCK_TIMEOUT)
+        if not await lock.acquire(blocking=False):
+            return False
+        keeper: asyncio.Task = asyncio.create_task(self._keep_lock(lock))
+        try:
+            return await self._flush_batch(client)
+        finally:
+            keeper.cancel()
+            try:
+                await lock.release()
+            except LockNotOwnedError:
+                logger.warning("User counters flush lock expired before the flush finished")
+
+    @staticmethod
+    async def _keep_lock(lock) -> None:
+        """Extending the flush lock while a slow flush runs"""
+        while True:
+            await asyncio.sleep(FLUSH_LOCK_TIMEOUT / 3)
+            try:
+                await lock.reacquire()
+            except Exception as e:
+                logger.error(f"Error extending the user counters flush lock: {e}")
+                return
+
+    async def _flush_batch(self, client) -> bool:
+        if self._claim_script is None:
+            self._claim_script = client.register_script(CLAIM_PENDING_SCRIPT)
+        await self._claim_script(keys=[PENDING_USERS, FLUSHING_USERS], args=[self.batch_size])
+
+        user_ids: List[int] = [int(user_id) for user_id in await client.srandmember(FLUSHING_USERS, self.batch_size)]
+        if not user_ids:
+            return False
+
+        pipe = client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(f"users:counters:flushing:{user_id}")
+        rows: Dict[str, list] = {'user_ids': [], 'keys': [], 'requests': [], 'days': [], 'times': []}
+        for user_id, counters in zip(user_ids, await pipe.execute()):
+            counters = self._decode(counters)
+            days: List[str] = sorted(field.split(':', 1)[1] for field in counters if field.startswith('requests:'))
+            if not days:
+                continue
+            # Only the requests of the latest day count towards the daily counter
+            rows['user_ids'].append(user_id)
+            rows['keys'].append(int(counters.get('keys', 0)))
+            rows['requests'].append(int(counters[f"requests:{days[-1]}"]))
+            rows['days'].append(date.fromisoformat(days[-1]))
+            rows['times'].append(datetime.fromtimestamp(float(counters['last_request_time']), timezone.utc))
+
+        try:
+            if rows['user_ids']:
+                async with await get_session() as session:
+                    await session.execute(FLUSH_QUERY, rows)
+                    await session.commit()
+        except Exception as e:
+            logger.error(f"Error writing counters of {len(user_ids)} users: {e}")
+            return False
+
+        pipe = client.pipeline(transaction=True)
+        for user_id in user_ids:
+            pipe.delete(f"users:counters:flushing:{user_id}")
+        pipe.srem(FLUSHING_USERS, *user_ids)
+        await pipe.execute()
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                while await self.flush():
+                    pass
+            except Exception as e:
+                logger.error(f"Error flushing user counters: {e}")
+
+    @staticmethod
+    def _decode(counters: dict) -> Dict[str, str]:
+        return {
+            (field.decode('utf-8') if isinstance(field, bytes) else field):
+                (value.decode('utf-8') if isinstance(value, bytes) else value)
+            for field, value in counters.items()
+        }
+
+
+user_counters = UserCounters()
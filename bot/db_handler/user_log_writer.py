@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from bot.bot_config import logger
+from db.database import get_session
+
+from .models import UserLog
+
+
+class UserLogWriter:
+    """Buffers user actions and writes them to `user_logs` in batches, on size or on interval."""
+
+    def __init__(self, max_batch_size: int = 500, flush_interval: float = 2.0, max_buffer_size: int = 20000) -> None:
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._worker and not self._worker.done():
+            return
+        self._flush_requested = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+        logger.info("✅ User log writer started")
+
+    async def stop(self) -> None:
+        """Stopping the worker and writing everything that is still buffered"""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._buffer:
+            if not await self.flush():
+                break
+        logger.info("📁 User log writer stopped")
+
+    def write(self, user_id: int, action: str) -> None:
+        """Adding a user action to the buffer, the time of the action is taken now"""
+        if len(self._buffer) >= self.max_buffer_size:
+            logger.warning(f"User log buffer is full, dropping the oldest {self.max_batch_size} entries")
+            del self._buffer[:self.max_batch_size]
+
+        self._buffer.append({'user_id': user_id, 'action': action, 'timestamp': datetime.now(timezone.utc)})
+        if len(self._buffer) >= self.max_batch_size and self._flush_requested:
+            self._flush_requested.set()
+
+    async def flush(self) -> bool:
+        """Writing one batch of buffered actions with a single multi-row insert"""
+        batch: List[Dict[str, Any]] = self._buffer[:self.max_batch_size]
+        if not batch:
+            return True
+        del self._buffer[:len(batch)]
+
+        try:
+            async with await get_session() as session:
+                await session.execute(insert(UserLog), batch)
+                await session.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} user logs: {e}")
+            # Keep the batch for the next attempt
+            self._buffer[:0] = batch
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+
+            while self._buffer:
+                if not await self.flush() or len(self._buffer) < self.max_batch_size:
+                    break
+
+
+user_log_writer = UserLogWriter()
@@ -0,0 +1,96 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from bot.bot_config import logger
+from config.redis_config import redis_manager as redis_client
+
+from .models import User
+
+PROFILE_KEY = "user:profile:{}"
+# Changes made outside the bot, e.g. directly in the database, become visible after this time
+PROFILE_TTL = 300
+
+
+class UserProfile(NamedTuple):
+    user_id: int
+    chat_id: int
+    is_banned: bool
+    user_role: Optional[str]
+    user_status: Optional[str]
+    language_code: Optional[str]
+    daily_requests_count: int
+    last_reset_date: Optional[date]
+    last_request_time: Optional[datetime]
+
+
+# Columns selected or returned to build a profile, in field order
+PROFILE_COLUMNS = (
+    User.user_id,
+    User.chat_id,
+    User.is_banned,
+    User.user_role,
+    User.user_status,
+    User.language_code,
+    User.daily_requests_count,
+    User.last_reset_date,
+    User.last_request_time,
+)
+
+
+def profile_from_row(row) -> UserProfile:
+    return UserProfile(
+        user_id=row.user_id,
+        chat_id=row.chat_id,
+        is_banned=bool(row.is_banned),
+        user_role=row.user_role,
+        user_status=row.user_status,
+        language_code=row.language_code,
+        daily_requests_count=row.daily_requests_count or 0,
+        last_reset_date=row.last_reset_date,
+        last_request_time=row.last_request_time,
+    )
+
+
+def _dump_profile(profile: UserProfile) -> str:
+    data: Dict[str, Any] = profile._asdict()
+    for field in ('last_reset_date', 'last_request_time'):
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return json.dumps(data)
+
+
+def _load_profile(raw: str) -> UserProfile:
+    data: Dict[str, Any] = json.loads(raw)
+    if data['last_reset_date']:
+        data['last_reset_date'] = date.fromisoformat(data['last_reset_date'])
+    if data['last_request_time']:
+        data['last_request_time'] = datetime.fromisoformat(data['last_request_time'])
+    return UserProfile(**data)
+
+
+async def get_cached_profile(user_id: int) -> Optional[UserProfile]:
+    try:
+        client = await redis_client.get_client()
+        raw = await client.get(PROFILE_KEY.format(user_id))
+        return _load_profile(raw) if raw else None
+    except Exception as e:
+        logger.error(f"Error reading cached profile of user {user_id}: {e}")
+        return None
+
+
+async def cache_profile(profile: UserProfile) -> None:
+    try:
+        client = await redis_client.get_client()
+        await client.set(PROFILE_KEY.format(profile.user_id), _dump_profile(profile), ex=PROFILE_TTL)
+    except Exception as e:
+        logger.error(f"Error caching profile of user {profile.user_id}: {e}")
+
+
+async def invalidate_user_profile(user_id: int) -> None:
+    """Dropping the cached profile so the next lookup reads the user from the database"""
+    try:
+        client = await redis_client.get_client()
+        await client.delete(PROFILE_KEY.format(user_id))
+    except Exception as e:
+        logger.error(f"Error invalidating profile of user {user_id}: {e}")
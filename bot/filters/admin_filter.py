@@ -1,35 +1,41 @@
 import asyncio
+from typing import Optional
 
 from aiogram.filters import BaseFilter
 from aiogram.types import Message
 
 from bot.bot_config import bot
 from bot.db_handler.db_service import get_user_role_and_ban_info
+from bot.db_handler.user_profile_cache import UserProfile
 from bot.handlers.handlers import send_menu_handler
 from bot.utils import get_translation
-from db.database import get_session
+from db.database import release_connection, session_scope
 
 
 class AdminFilter(BaseFilter):
-    async def __call__(self, message: Message) -> bool:
-        async with await get_session() as session:
-            user_id: int = message.from_user.id
-            user_info = await get_user_role_and_ban_info(session, user_id)
+    async def __call__(self, message: Message, user_profile: Optional[UserProfile] = None) -> bool:
+        user_id: int = message.from_user.id
+        # The profile loaded for the update is reused
+        user_info: Optional[UserProfile] = user_profile
+        if user_info is None or user_info.user_id != user_id:
+            async with session_scope() as session:
+                user_info = await get_user_role_and_ban_info(session, user_id)
 
-            if user_info.user_role != 'admin':
-                await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id)
-                not_admin_message: str = await get_translation(user_id, "admin", "no_access")
-                message_sent = await bot.send_message(
-                    chat_id=message.chat.id,
-                    text=not_admin_message,
-                )
-                await asyncio.sleep(1)
-                await bot.delete_message(
-                    chat_id=message.chat.id,
-                    message_id=message_sent.message_id,
-                )
+        if user_info.user_role != 'admin':
+            not_admin_message: str = await get_translation(user_id, "admin", "no_access")
+            await release_connection()
+            await bot.delete_message(chat_id=message.chat.id, message_id=message.message_id)
+            message_sent = await bot.send_message(
+                chat_id=message.chat.id,
+                text=not_admin_message,
+            )
+            await asyncio.sleep(1)
+            await bot.delete_message(
+                chat_id=message.chat.id,
+                message_id=message_sent.message_id,
+            )
 
-                await send_menu_handler(message)
-                return False
+            await send_menu_handler(message)
+            return False
 
-            return True
+        return True
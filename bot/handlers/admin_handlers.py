@@ -4,16 +4,17 @@ from typing import Dict, List, Optional
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
 from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.bot_config import BOT_ID, GROUP_CHAT_ID, bot, logger
 from bot.db_handler.db_service import (
     get_admin_chat_ids,
     get_keys_count_for_games,
-    get_subscribed_users,
     get_user_details,
     get_users_list_admin_panel,
     log_user_action,
 )
+from bot.db_handler.reply_routes import save_reply_routes
 from bot.keyboards.admin_kb import (
     confirmation_button_notification,
     get_admin_panel_keyboard,
@@ -24,16 +25,13 @@ from bot.keyboards.admin_kb import (
 from bot.keyboards.referral_links_kb import referral_links_keyboard
 from bot.states.form import Form, FormSendToUser
 from bot.utils import get_translation, load_image
+from bot.utils.broadcaster import broadcaster
 from bot.utils.static_data import GAMES
-from db.database import get_session
+from db.database import release_connection
 
 router = Router()
 
 
-# Mapping between forwarded message IDs and user IDs
-message_user_mapping: Dict[int, int] = {}
-
-
 # Admin panel handler
 async def handle_admin_command_handler(message: types.Message, user_id: int) -> None:
     admin_text: str = await get_translation(user_id, "admin", "panel_description")
@@ -47,37 +45,35 @@ async def handle_admin_command_handler(message: types.Message, user_id: int) ->
 
 # Get keys button admin panel
 @router.callback_query(F.data == "keys_admin_panel")
-async def keys_admin_panel_handler(callback: types.CallbackQuery) -> None:
-    async with await get_session() as session:
-        user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
-        keys_count_message: str = await get_keys_count_for_games(session, GAMES)
+async def keys_admin_panel_handler(callback: types.CallbackQuery, session: AsyncSession) -> None:
+    user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
+    keys_count_message: str = await get_keys_count_for_games(session, GAMES)
 
-        await bot.edit_message_text(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            text=keys_count_message,
-            reply_markup=await get_main_admin(user_id)
-        )
+    await bot.edit_message_text(
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+        text=keys_count_message,
+        reply_markup=await get_main_admin(user_id)
+    )
 
 
 # Get users button admin panel
 @router.callback_query(F.data == "users_admin_panel")
-async def users_admin_panel_handler(callback: types.CallbackQuery) -> None:
-    async with await get_session() as session:
-        user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
-        message_text: str = await get_users_list_admin_panel(session, GAMES)
-        back_keyboard: InlineKeyboardMarkup = await get_main_admin(user_id)
-        detail_info_keyboard: InlineKeyboardMarkup = await get_detail_info_in_admin(user_id)
-        combined_keyboard: InlineKeyboardMarkup = InlineKeyboardMarkup(
-            inline_keyboard=detail_info_keyboard.inline_keyboard + back_keyboard.inline_keyboard
-        )
+async def users_admin_panel_handler(callback: types.CallbackQuery, session: AsyncSession) -> None:
+    user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
+    message_text: str = await get_users_list_admin_panel(session, GAMES)
+    back_keyboard: InlineKeyboardMarkup = await get_main_admin(user_id)
+    detail_info_keyboard: InlineKeyboardMarkup = await get_detail_info_in_admin(user_id)
+    combined_keyboard: InlineKeyboardMarkup = InlineKeyboardMarkup(
+        inline_keyboard=detail_info_keyboard.inline_keyboard + back_keyboard.inline_keyboard
+    )
 
-        await bot.edit_message_text(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            text=message_text,
-            reply_markup=combined_keyboard
-        )
+    await bot.edit_message_text(
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+        text=message_text,
+        reply_markup=combined_keyboard
+    )
 
 
 @router.callback_query(F.data == "detail_info_in_admin")
@@ -94,33 +90,32 @@ async def request_user_id_handler(callback: types.CallbackQuery, state: FSMConte
 
 # Get user detail button admin panel
 @router.message(Form.user_id_entry)
-async def user_detail_admin_panel(message: types.Message, state: FSMContext) -> None:
+async def user_detail_admin_panel(message: types.Message, state: FSMContext, session: AsyncSession) -> None:
     user_detail_id: str = message.text.strip()
 
-    async with await get_session() as session:
-        user_id: int = message.from_user.id if message.from_user.id != BOT_ID else message.chat.id
-        keyboard: InlineKeyboardMarkup = await get_main_admin(user_id)
+    user_id: int = message.from_user.id if message.from_user.id != BOT_ID else message.chat.id
+    keyboard: InlineKeyboardMarkup = await get_main_admin(user_id)
 
-        try:
-            user_detail_id: int = int(user_detail_id)
-        except ValueError:
-            await message.answer("<i><b>ID</b> must be an integer. Please do it again!</i>", reply_markup=keyboard)
-            return
+    try:
+        user_detail_id: int = int(user_detail_id)
+    except ValueError:
+        await message.answer("<i><b>ID</b> must be an integer. Please do it again!</i>", reply_markup=keyboard)
+        return
 
-        try:
-            user_details: str = await get_user_details(session, user_detail_id)
-        except Exception as e:
-            logger.error(f"Database error occurred: {e}")
-            await message.answer(
-                text="<i>Error occurred while fetching user details. Try again later.</i>",
-                reply_markup=keyboard
-            )
-            return
+    try:
+        user_details: str = await get_user_details(session, user_detail_id)
+    except Exception as e:
+        logger.error(f"Database error occurred: {e}")
+        await message.answer(
+            text="<i>Error occurred while fetching user details. Try again later.</i>",
+            reply_markup=keyboard
+        )
+        return
 
-        if "not_found" in user_details:
-            await message.answer("<i>User with this <b>ID</b> not found!</i>", reply_markup=keyboard)
-        else:
-            await message.answer(user_details, reply_markup=keyboard)
+    if "not_found" in user_details:
+        await message.answer("<i>User with this <b>ID</b> not found!</i>", reply_markup=keyboard)
+    else:
+        await message.answer(user_details, reply_markup=keyboard)
 
     await state.clear()
 
@@ -158,133 +153,90 @@ async def notification_menu_handler(callback: types.CallbackQuery) -> None:
 async def send_notification_to_self_handler(callback: types.CallbackQuery) -> None:
     notif_key: str = callback.data.split('send_self_')[-1]
 
-    async with await get_session() as session:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
-        await bot.delete_message(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id
-        )
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
+    await bot.delete_message(
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id
+    )
 
-        await log_user_action(session, user_id, "Sent ad to themselves")
+    await log_user_action(user_id, "Sent ad to themselves")
 
-        notification_text: str = await get_translation(user_id, "notifications", notif_key)
-        photo: Optional[FSInputFile] = await load_image("notification", specific_image=f"{notif_key}.png")
-        keyboard: InlineKeyboardMarkup = await referral_links_keyboard(user_id)
+    notification_text: str = await get_translation(user_id, "notifications", notif_key)
+    photo: Optional[FSInputFile | str] = await load_image("notification", specific_image=f"{notif_key}.png")
+    keyboard: InlineKeyboardMarkup = await referral_links_keyboard(user_id)
+    await release_connection()
 
-        try:
-            test_message = await bot.send_photo(
-                chat_id=callback.message.chat.id,
-                photo=photo,
-                caption=notification_text,
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            logger.error(f"Failed to send photo notification: {e}")
-            error_text: str = f"Failed to send photo notification: {e}"
-            test_message = await bot.send_message(
-                chat_id=callback.message.chat.id,
-                text=error_text
-            )
+    try:
+        test_message = await bot.send_photo(
+            chat_id=callback.message.chat.id,
+            photo=photo,
+            caption=notification_text,
+            reply_markup=keyboard
+        )
+    except Exception as e:
+        logger.error(f"Failed to send photo notification: {e}")
+        error_text: str = f"Failed to send photo notification: {e}"
+        test_message = await bot.send_message(
+            chat_id=callback.message.chat.id,
+            text=error_text
+        )
 
-        await asyncio.sleep(7)
+    await asyncio.sleep(7)
 
-        keyboard_after: InlineKeyboardMarkup = await notification_menu()
+    keyboard_after: InlineKeyboardMarkup = await notification_menu()
 
-        if test_message:
-            await bot.delete_message(
-                chat_id=callback.message.chat.id,
-                message_id=test_message.message_id
-            )
-            await bot.send_message(
-                chat_id=callback.message.chat.id,
-                text="🚨 Watch out! The panel for sending notifications to users 📤",
-                reply_markup=keyboard_after
-            )
-        else:
-            logger.warning("Photo notification was not sent, so no message to delete.")
+    if test_message:
+        await bot.delete_message(
+            chat_id=callback.message.chat.id,
+            message_id=test_message.message_id
+        )
+        await bot.send_message(
+            chat_id=callback.message.chat.id,
+            text="🚨 Watch out! The panel for sending notifications to users 📤",
+            reply_markup=keyboard_after
+        )
+    else:
+        logger.warning("Photo notification was not sent, so no message to delete.")
 
 
 @router.callback_query(F.data.startswith('send_all_'))
 async def confirm_send_all_notifications_handler(callback: types.CallbackQuery) -> None:
     notif_key: str = callback.data.split('send_all_')[-1]
 
-    async with await get_session() as session:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
 
-        await log_user_action(session, user_id, "Confirmation send notification")
+    await log_user_action(user_id, "Confirmation send notification")
 
-        keyboard: InlineKeyboardMarkup = await confirmation_button_notification(notif_key)
+    keyboard: InlineKeyboardMarkup = await confirmation_button_notification(notif_key)
 
-        await bot.edit_message_text(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            text="‼️ <i>Send a notification to <b>ALL</b> users ?</i> ‼️",
-            reply_markup=keyboard
-        )
+    await bot.edit_message_text(
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+        text="‼️ <i>Send a notification to <b>ALL</b> users ?</i> ‼️",
+        reply_markup=keyboard
+    )
 
 
 @router.callback_query(F.data.startswith('confirm_send_all_'))
 async def confirm_send_all_handler(callback: types.CallbackQuery) -> None:
     notif_key: str = callback.data.split('confirm_send_all_')[-1]
 
-    async with await get_session() as session:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
-        await bot.delete_message(
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id
-        )
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
+    await bot.delete_message(
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id
+    )
 
-        await log_user_action(session, user_id, "Started sending notifications to all users")
-
-        # Getting a list of users for mailing
-        users: List[types.User] = await get_subscribed_users(session)
-
-        photo: Optional[FSInputFile] = await load_image("notification", specific_image=f"{notif_key}.png")
-
-        for user in users:
-            chat_id: int = user.chat_id
-            first_name: str = user.first_name
-
-            # Notification text
-            notification_text: str = await get_translation(chat_id, "notifications", notif_key)
-            personalized_text: str = f"{first_name}, {notification_text}"
-            keyboard: InlineKeyboardMarkup = await referral_links_keyboard(chat_id)
-
-            if photo:
-                try:
-                    await bot.send_photo(
-                        chat_id=chat_id,
-                        photo=photo,
-                        caption=personalized_text,
-                        reply_markup=keyboard
-                    )
-                    await asyncio.sleep(0.05)
-                except Exception as e:
-                    logger.error(f"Failed to send photo notification to {chat_id}: {e}")
-            else:
-                try:
-                    await bot.send_message(
-                        chat_id=chat_id,
-                        text=personalized_text,
-                        reply_markup=keyboard
-                    )
-                    await asyncio.sleep(0.05)
-                except Exception as e:
-                    logger.error(f"Failed to send text notification to {chat_id}: {e}")
-
-        keyboard_after: InlineKeyboardMarkup = await get_admin_panel_keyboard(user_id)
+    await log_user_action(user_id, "Started sending notifications to all users")
 
-        await bot.send_message(
-            chat_id=callback.message.chat.id,
-            text="📬 <i>The mailing has been successfully <b>completed</b>!!</i> 📭",  # Add translation ‼️
-            reply_markup=keyboard_after
-        )
+    # The mailing runs in the background and reports its progress to the admin
+    await broadcaster.create_notification(callback.message.chat.id, user_id, notif_key)
 
 
 # Button for requesting user ID
@@ -408,7 +360,7 @@ async def forward_message_to_admins(message: Message) -> Dict[int, int]:
     for admin_chat_id, result in zip(admin_chat_ids + [GROUP_CHAT_ID], results):
         if isinstance(result, types.Message):
             message_ids[admin_chat_id] = result.message_id
-            message_user_mapping[result.message_id] = message.from_user.id
+    await save_reply_routes(message.from_user.id, message_ids)
 
     # Handle any exceptions that were raised during execution
     for result in results:
@@ -1,18 +1,74 @@
+import hashlib
+import json
+from typing import Optional
+
 from aiogram import Bot
-from aiogram.types import BotCommand, BotCommandScopeChat
+from aiogram.types import BotCommand, BotCommandScopeChat, BotCommandScopeDefault
 
-from bot.utils import get_translation
+from bot.bot_config import logger
+from bot.translations import translation_manager
+from bot.utils.static_data import SUPPORTED_LANGUAGES
+from config.redis_config import redis_manager as redis_client
 
+# Digest of the commands registered last, so restarts only call Telegram when they have changed
+COMMANDS_DIGEST_KEY = "commands:digest"
+# Language of the chats whose commands differ from those of their Telegram language
+COMMAND_OVERRIDES_KEY = "commands:overrides"
 
-async def set_user_commands(bot: Bot, user_id: int) -> None:
-    start_bot_desc: str = await get_translation(user_id, "commands", "start_bot")
-    change_language_desc: str = await get_translation(user_id, "commands", "change_language")
-    admin_panel_desc: str = await get_translation(user_id, "commands", "admin_panel")
 
-    commands: list[BotCommand] = [
-        BotCommand(command="/start", description=start_bot_desc),
-        BotCommand(command="/change_lang", description=change_language_desc),
-        BotCommand(command="/admin", description=admin_panel_desc),
+def build_commands(language_code: str) -> list[BotCommand]:
+    return [
+        BotCommand(command="/start", description=translation_manager.get_translation(
+            language_code, "commands", "start_bot")),
+        BotCommand(command="/change_lang", description=translation_manager.get_translation(
+            language_code, "commands", "change_language")),
+        BotCommand(command="/admin", description=translation_manager.get_translation(
+            language_code, "commands", "admin_panel")),
     ]
 
-    await bot.set_my_commands(commands, scope=BotCommandScopeChat(chat_id=user_id))
+
+def default_language(client_language: Optional[str]) -> str:
+    """Getting the bot language of a user whose Telegram app uses `client_language`"""
+    return client_language if client_language in SUPPORTED_LANGUAGES else 'en'
+
+
+async def register_commands(bot: Bot) -> None:
+    """Registering the commands once for every supported language, shown by the user's Telegram language"""
+    commands: dict[str, list[BotCommand]] = {
+        language_code: build_commands(language_code) for language_code in SUPPORTED_LANGUAGES
+    }
+    digest: str = hashlib.sha256(json.dumps(
+        {language_code: [command.model_dump() for command in items] for language_code, items in commands.items()},
+        sort_keys=True,
+    ).encode()).hexdigest()
+
+    client = await redis_client.get_client()
+    stored = await client.get(COMMANDS_DIGEST_KEY)
+    if stored is not None and (stored.decode('utf-8') if isinstance(stored, bytes) else stored) == digest:
+        return
+
+    # Users whose Telegram language isn't supported see the English commands
+    await bot.set_my_commands(commands['en'], scope=BotCommandScopeDefault())
+    for language_code, items in commands.items():
+        await bot.set_my_commands(items, scope=BotCommandScopeDefault(), language_code=language_code)
+    await client.set(COMMANDS_DIGEST_KEY, digest)
+    logger.info(f"✅ Bot commands registered for {len(commands)} languages")
+
+
+async def set_user_commands(bot: Bot, chat_id: int, language_code: str, client_language: Optional[str]) -> None:
+    """Showing the commands in the chosen language, only chats that need it get their own commands"""
+    client = await redis_client.get_client()
+    if language_code != default_language(client_language):
+        await bot.set_my_commands(build_commands(language_code), scope=BotCommandScopeChat(chat_id=chat_id))
+        await client.hset(COMMAND_OVERRIDES_KEY, chat_id, language_code)
+    else:
+        # Chats can also have commands set by earlier versions of the bot, so they are always removed here
+        await client.hdel(COMMAND_OVERRIDES_KEY, chat_id)
+        await bot.delete_my_commands(scope=BotCommandScopeChat(chat_id=chat_id))
+
+
+async def reset_user_commands(bot: Bot, chat_id: int) -> None:
+    """Returning the chat to the commands of its Telegram language"""
+    client = await redis_client.get_client()
+    if await client.hdel(COMMAND_OVERRIDES_KEY, chat_id):
+        await bot.delete_my_commands(scope=BotCommandScopeChat(chat_id=chat_id))
@@ -7,9 +7,6 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.bot_config import BOT_ID, bot, logger
 from bot.db_handler.db_service import (
-    check_user_limits,
-    delete_keys,
-    get_keys,
     get_keys_count_main_menu,
     get_or_create_user,
     get_user_language,
@@ -19,7 +16,10 @@ from bot.db_handler.db_service import (
     update_keys_generated,
     update_user_language,
 )
-from bot.handlers.command_setup import set_user_commands
+from bot.db_handler.key_claim_service import KeyReservation, key_claim_service
+from bot.db_handler.rate_limiter import RateLimitResult, rate_limiter
+from bot.db_handler.user_profile_cache import UserProfile
+from bot.handlers.command_setup import reset_user_commands, set_user_commands
 from bot.keyboards.back_to_main_kb import get_back_to_main_menu_button
 from bot.keyboards.donate_kb import get_donation_keyboard
 from bot.keyboards.inline import (
@@ -31,9 +31,8 @@ from bot.keyboards.referral_links_kb import referral_links_keyboard
 from bot.states.form import Form
 from bot.utils import get_available_languages, get_translation, load_image
 from bot.utils.services import generate_user_stats
-from bot.utils.static_data import GAMES, STATUS_LIMITS, SUPPORTED_LANGUAGES
-from bot.utils.utils import get_remaining_time
-from db.database import get_session
+from bot.utils.static_data import GAMES, SUPPORTED_LANGUAGES
+from db.database import session_scope
 
 router = Router()
 
@@ -54,22 +53,23 @@ async def welcome_command_handler(
             'language_code': user_language_code
         }
 
-        await log_user_action(session, user_id, "/start command used")
+        await log_user_action(user_id, "/start command used")
 
         user_record = await get_or_create_user(session, chat_id, user_data)
 
+        # The language is updated by the same statement if it has changed
         if user_record is None:
             await message.answer("Error creating user.")
             return
 
-        # Update user language if necessary
-        if user_record.language_code != user_data['language_code']:
-            await update_user_language(session, user_id, user_data['language_code'])
+        # The language now matches the Telegram language, so the commands registered for it apply
+        if user_record.changed:
+            await reset_user_commands(bot, chat_id)
 
         translation: str = await get_translation(user_id, "common", "welcome")
         welcome_text: str = translation.format(first_name=user.first_name)
 
-        photo: Optional[InputFile] = await load_image("welcome")
+        photo: Optional[InputFile | str] = await load_image("welcome")
         if photo:
             try:
                 await bot.send_photo(
@@ -100,7 +100,7 @@ async def welcome_command_handler(
 
 # Function to send keys menu after generating keys
 async def send_menu_handler(message: types.Message, is_back_to_menu: bool = False) -> None:
-    async with await get_session() as session:
+    async with session_scope() as session:
         user_id: int = message.from_user.id if message.from_user.id != BOT_ID else message.chat.id
         chat_id: int = message.chat.id
 
@@ -109,7 +109,7 @@ async def send_menu_handler(message: types.Message, is_back_to_menu: bool = Fals
         caption: str = await get_translation(user_id, "messages", "choose_action")
         keys_data: Dict = await get_keys_count_main_menu(session, GAMES)
 
-        photo: Optional[InputFile] = await load_image("key_generated")
+        photo: Optional[InputFile | str] = await load_image("key_generated")
         if photo:
             if is_back_to_menu and message.photo:
                 await bot.edit_message_media(
@@ -153,7 +153,7 @@ async def send_menu_handler(message: types.Message, is_back_to_menu: bool = Fals
 async def referral_links_handler(callback: types.CallbackQuery) -> None:
     user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
 
-    photo: Optional[InputFile] = await load_image("premium")
+    photo: Optional[InputFile | str] = await load_image("premium")
 
     caption_ref_link: str = await get_translation(user_id, "messages", "referral_links_intro")
     chat_id: int = callback.message.chat.id
@@ -191,143 +191,117 @@ async def referral_links_handler(callback: types.CallbackQuery) -> None:
 
 
 async def change_language_logic_handler(message: types.Message, user_id: int, state: FSMContext) -> None:
-    async with await get_session() as session:
+    # Log user action
+    await log_user_action(user_id, "/change_lang command used")
 
-        # Log user action
-        await log_user_action(session, user_id, "/change_lang command used")
+    available_languages: Dict = get_available_languages()
 
-        available_languages: Dict = get_available_languages()
+    # Creating a keyboard using a separate function
+    keyboard_markup: InlineKeyboardMarkup = create_language_keyboard(available_languages)
 
-        # Creating a keyboard using a separate function
-        keyboard_markup: InlineKeyboardMarkup = create_language_keyboard(available_languages)
-
-        # Sending a message with the keypad
-        lang_message = await bot.send_message(
-            chat_id=message.chat.id,
-            text=await get_translation(user_id, "common", "choose_language"),
-            reply_markup=keyboard_markup
-        )
+    # Sending a message with the keypad
+    lang_message = await bot.send_message(
+        chat_id=message.chat.id,
+        text=await get_translation(user_id, "common", "choose_language"),
+        reply_markup=keyboard_markup
+    )
 
-        # Saving message IDs in the state
-        await state.update_data(lang_message_id=lang_message.message_id, prev_message_id=message.message_id)
+    # Saving message IDs in the state
+    await state.update_data(lang_message_id=lang_message.message_id, prev_message_id=message.message_id)
 
-        await state.set_state(Form.language_selection)
+    await state.set_state(Form.language_selection)
 
 
 @router.callback_query(F.data == "settings_choose_language")
 async def language_button_handler(callback: types.CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
-    async with await get_session() as _:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
-        await change_language_logic_handler(callback.message, user_id, state)
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
+    await change_language_logic_handler(callback.message, user_id, state)
 
 
 # Language selection processing
 @router.callback_query(F.data.in_(get_available_languages().keys()))
-async def set_language(callback: types.CallbackQuery, state: FSMContext) -> None:
-    async with await get_session() as session:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
+async def set_language(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
 
-        selected_language: str = callback.data
+    selected_language: str = callback.data
 
-        # Updating the language in the database
-        await update_user_language(session, user_id, selected_language)
+    # Updating the language in the database
+    await update_user_language(session, user_id, selected_language)
 
-        await get_user_language(session, user_id)
+    # Commands in the selected language, unless the user's Telegram language already shows them
+    await set_user_commands(bot, callback.message.chat.id, selected_language, callback.from_user.language_code)
 
-        # Set commands for the selected language
-        await set_user_commands(bot, user_id)
+    new_language: str = await get_user_language(session, user_id)
+    logger.info(f"Language after update for user {user_id}: {new_language}")
 
-        # Forcibly query the language from the database again
-        new_language: str = await get_user_language(session, user_id)
-        logger.info(f"Language after update for user {user_id}: {new_language}")
+    # Log user action
+    await log_user_action(user_id, f"Language changed to {selected_language}")
 
-        # Log user action
-        await log_user_action(session, user_id, f"Language changed to {selected_language}")
+    # Deleting the language selection message and the user's command message
+    data: Dict = await state.get_data()
+    if "lang_message_id" in data:
+        await bot.delete_message(chat_id=callback.message.chat.id, message_id=data["lang_message_id"])
+    if "prev_message_id" in data:
+        await bot.delete_message(chat_id=callback.message.chat.id, message_id=data["prev_message_id"])
+    if "user_command_message_id" in data:
+        await bot.delete_message(chat_id=callback.message.chat.id, message_id=data["user_command_message_id"])
 
-        # Deleting the language selection message and the user's command message
-        data: Dict = await state.get_data()
-        if "lang_message_id" in data:
-            await bot.delete_message(chat_id=callback.message.chat.id, message_id=data["lang_message_id"])
-        if "prev_message_id" in data:
-            await bot.delete_message(chat_id=callback.message.chat.id, message_id=data["prev_message_id"])
-        if "user_command_message_id" in data:
-            await bot.delete_message(chat_id=callback.message.chat.id, message_id=data["user_command_message_id"])
+    await callback.answer(await get_translation(user_id, "common", "language_selected"))
 
-        await callback.answer(await get_translation(user_id, "common", "language_selected"))
+    # Displaying the updated action menu
+    await send_menu_handler(callback.message)
 
-        # Displaying the updated action menu
-        await send_menu_handler(callback.message)
-
-        # Resetting the state
-        await state.clear()
+    # Resetting the state
+    await state.clear()
 
 
 # Handling of "get_keys" button pressing
 @router.callback_query(F.data == "keys_regular")
-async def keys_handler(callback: types.CallbackQuery) -> None:
+async def keys_handler(
+        callback: types.CallbackQuery, session: AsyncSession, user_profile: Optional[UserProfile] = None
+) -> None:
     try:
-        async with (await get_session()) as session:
-            user_id: int = (
-                callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-            )
-            await callback.answer()
-
-            user_info = await get_user_status_info(session, user_id)
-
-            # Checking the request limit
-            if not await check_user_limits(session, user_id, STATUS_LIMITS):
-                await send_daily_limit_reached_handler(callback, user_id)
-                return
-
-            # Checking the interval between requests
-            interval_minutes: int = STATUS_LIMITS[user_info.user_status]['interval_minutes']
-            minutes, seconds = get_remaining_time(user_info.last_request_time, interval_minutes)
-            if minutes > 0 or seconds > 0:
-                wait_message_template: str = await get_translation(user_id, "messages", "wait_time_without_hours")
-                wait_message = wait_message_template.format(minutes=minutes, sec=seconds)
-                await send_wait_time_handler(callback, user_id, wait_message)
-                return
+        user_id: int = (
+            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+        )
+        await callback.answer()
 
-            await bot.edit_message_reply_markup(
-                chat_id=callback.message.chat.id,
-                message_id=callback.message.message_id,
-                reply_markup=None
-            )
+        # The profile looked up by the ban check middleware is reused
+        user_info: Optional[UserProfile] = (
+            user_profile if user_profile and user_profile.user_id == user_id
+            else await get_user_status_info(session, user_id)
+        )
 
-            keys_list: List[Dict[str, str]] = []
-            for game in GAMES:
-                keys: Dict[str, str] = await get_keys(session, game)
-                keys_list.append(keys)
-
-            response_text_template: str = await get_translation(user_id, "messages", 'keys_generated_success')
-            response_text: str = f"{response_text_template}\n\n"
-            total_keys_in_request: int = 0
-
-            for game, keys in zip(GAMES, keys_list):
-                if keys:
-                    total_keys_in_request += len(keys)
-                    response_text += f"<b>{game}</b>:\n"
-                    keys_to_delete: List[str] = [key for key in keys]
-                    response_text += "\n".join([f"<code>{key}</code>" for key in keys_to_delete]) + "\n\n"
-                    await delete_keys(session, game, keys_to_delete)
-                else:
-                    no_keys_template: str = await get_translation(user_id, "messages", 'no_keys_available')
-                    response_text += no_keys_template.format(game=game)
+        # Checking the request limit and the interval between requests in one step
+        limit: RateLimitResult = await rate_limiter.acquire(user_id, user_info)
+        if limit.daily_limit_reached:
+            await send_daily_limit_reached_handler(callback, user_id)
+            return
+        if not limit.allowed:
+            minutes, seconds = divmod(limit.wait_seconds, 60)
+            wait_message_template: str = await get_translation(user_id, "messages", "wait_time_without_hours")
+            wait_message = wait_message_template.format(minutes=minutes, sec=seconds)
+            await send_wait_time_handler(callback, user_id, wait_message)
+            return
 
-            await bot.send_message(
-                chat_id=callback.message.chat.id,
-                text=response_text.strip()
-            )
+        try:
+            total_keys_in_request: int = await send_keys_handler(callback, user_id)
+        except Exception:
+            await rate_limiter.refund(user_id)
+            raise
 
-            if total_keys_in_request > 0:
-                await update_keys_generated(session, user_id, total_keys_in_request)
+        # A request that handed out no keys doesn't count against the limits
+        if total_keys_in_request > 0:
+            await update_keys_generated(user_id, total_keys_in_request)
+        else:
+            await rate_limiter.refund(user_id)
 
-            await send_menu_handler(callback.message)
+        await send_menu_handler(callback.message)
 
     except Exception as e:
         logger.error(f"Error processing get_keys: {e}")
@@ -335,11 +309,54 @@ async def keys_handler(callback: types.CallbackQuery) -> None:
         await callback.answer(error_text)
 
 
+# Claiming keys for every game and sending them, returns the number of keys sent
+async def send_keys_handler(callback: types.CallbackQuery, user_id: int) -> int:
+    await bot.edit_message_reply_markup(
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+        reply_markup=None
+    )
+
+    # Keys stay reserved for the user until the message with them is delivered
+    reservation: KeyReservation = await key_claim_service.claim(user_id, GAMES)
+
+    response_text_template: str = await get_translation(user_id, "messages", 'keys_generated_success')
+    response_text: str = f"{response_text_template}\n\n"
+    total_keys_in_request: int = 0
+
+    for game in GAMES:
+        keys: List[str] = reservation.keys.get(game, [])
+        if keys:
+            total_keys_in_request += len(keys)
+            response_text += f"<b>{game}</b>:\n"
+            response_text += "\n".join([f"<code>{key}</code>" for key in keys]) + "\n\n"
+        else:
+            no_keys_template: str = await get_translation(user_id, "messages", 'no_keys_available')
+            response_text += no_keys_template.format(game=game)
+
+    try:
+        await bot.send_message(
+            chat_id=callback.message.chat.id,
+            text=response_text.strip()
+        )
+    except Exception:
+        await key_claim_service.release(reservation)
+        raise
+
+    # The user has the keys, a failed commit is retried by the claim service and isn't refunded
+    try:
+        await key_claim_service.commit(reservation)
+    except Exception as e:
+        logger.error(f"Error committing key reservation {reservation.reservation_id}: {e}")
+
+    return total_keys_in_request
+
+
 # Function for sending a message when the daily limit is reached
 async def send_daily_limit_reached_handler(callback: types.CallbackQuery, user_id: int) -> None:
     limit_message: str = await get_translation(user_id, "messages", "daily_limit_exceeded")
 
-    photo: Optional[InputFile] = await load_image("premium")
+    photo: Optional[InputFile | str] = await load_image("premium")
     if photo:
         await bot.delete_message(
             chat_id=callback.message.chat.id,
@@ -362,7 +379,7 @@ async def send_daily_limit_reached_handler(callback: types.CallbackQuery, user_i
 async def send_wait_time_handler(callback: types.CallbackQuery, user_id: int, wait_message: str) -> None:
     chat_id: int = callback.message.chat.id
     message_id: int = callback.message.message_id
-    photo: Optional[InputFile] = await load_image("premium")
+    photo: Optional[InputFile | str] = await load_image("premium")
     if photo:
         new_media: InputMediaPhoto = types.InputMediaPhoto(media=photo, caption=wait_message)
 
@@ -400,138 +417,134 @@ async def send_wait_time_handler(callback: types.CallbackQuery, user_id: int, wa
 
 # Handling banned users
 async def banned_user_handler(message: types.Message) -> None:
-    async with await get_session() as session:
-        user_id: int = message.from_user.id if message.from_user.id != BOT_ID else message.chat.id
-        chat_id: int = message.chat.id
+    user_id: int = message.from_user.id if message.from_user.id != BOT_ID else message.chat.id
+    chat_id: int = message.chat.id
 
-        # User action logger
-        await log_user_action(session, user_id, "Attempted interaction while banned")
+    # User action logger
+    await log_user_action(user_id, "Attempted interaction while banned")
 
-        photo: Optional[InputFile] = await load_image("banned")
-        if photo:
-            await bot.send_photo(
-                chat_id,
-                photo=photo,
-                caption=await get_translation(user_id, "common", "ban_notification")
-            )
-            return
-        await bot.send_message(chat_id, await get_translation(user_id, "common", "ban_notification"))
+    photo: Optional[InputFile | str] = await load_image("banned")
+    if photo:
+        await bot.send_photo(
+            chat_id,
+            photo=photo,
+            caption=await get_translation(user_id, "common", "ban_notification")
+        )
+        return
+    await bot.send_message(chat_id, await get_translation(user_id, "common", "ban_notification"))
 
 
 # Settings button
 @router.callback_query(F.data == "settings_menu")
 async def settings_handler(callback: types.CallbackQuery) -> None:
-    async with await get_session() as session:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
 
-        await log_user_action(session, user_id, "Settings menu opened")
-        settings_message: str = await get_translation(user_id, "messages", "settings_intro")
-        photo: Optional[InputFile] = await load_image("settings")
-        if photo:
-            new_media: InputMediaPhoto = types.InputMediaPhoto(media=photo, caption=settings_message)
-            if callback.message.photo:
-                await bot.edit_message_media(
-                    chat_id=callback.message.chat.id,
-                    message_id=callback.message.message_id,
-                    media=new_media,
-                    reply_markup=await get_settings_menu(user_id)
-                )
-            else:
-                await bot.delete_message(
-                    chat_id=callback.message.chat.id,
-                    message_id=callback.message.message_id
-                )
-                await bot.send_photo(
-                    chat_id=callback.message.chat.id,
-                    photo=photo,
-                    caption=settings_message,
-                    reply_markup=await get_settings_menu(user_id)
-                )
-            return
-        if callback.message.text:
-            await bot.edit_message_text(
+    await log_user_action(user_id, "Settings menu opened")
+    settings_message: str = await get_translation(user_id, "messages", "settings_intro")
+    photo: Optional[InputFile | str] = await load_image("settings")
+    if photo:
+        new_media: InputMediaPhoto = types.InputMediaPhoto(media=photo, caption=settings_message)
+        if callback.message.photo:
+            await bot.edit_message_media(
                 chat_id=callback.message.chat.id,
                 message_id=callback.message.message_id,
-                text=settings_message,
+                media=new_media,
                 reply_markup=await get_settings_menu(user_id)
             )
+        else:
+            await bot.delete_message(
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id
+            )
+            await bot.send_photo(
+                chat_id=callback.message.chat.id,
+                photo=photo,
+                caption=settings_message,
+                reply_markup=await get_settings_menu(user_id)
+            )
+        return
+    if callback.message.text:
+        await bot.edit_message_text(
+            chat_id=callback.message.chat.id,
+            message_id=callback.message.message_id,
+            text=settings_message,
+            reply_markup=await get_settings_menu(user_id)
+        )
 
 
 # User statistic
 @router.callback_query(F.data == "user_stats")
-async def user_stats_handler(callback: types.CallbackQuery) -> None:
-    async with await get_session() as session:
-        user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
+async def user_stats_handler(callback: types.CallbackQuery, session: AsyncSession) -> None:
+    user_id: int = callback.from_user.id if callback.from_user.id != BOT_ID else callback.chat.id
 
-        await log_user_action(session, user_id, "User checked stats")
+    await log_user_action(user_id, "User checked stats")
 
-        user_data = await get_user_stats(session, user_id, GAMES)
-        if not user_data:
-            await callback.answer("User not found!")
+    user_data = await get_user_stats(session, user_id, GAMES)
+    if not user_data:
+        await callback.answer("User not found!")
 
-        user_stats: Dict[str, Any] = await generate_user_stats(user_data)
+    user_stats: Dict[str, Any] = await generate_user_stats(user_data)
 
-        chat_id: int = callback.message.chat.id
-        message_id: int = callback.message.message_id
-        stats_translation: str = await get_translation(user_id, "messages", "user_stats")
-        user_status: str = await get_translation(user_id, "statuses", f"{user_stats['user_status']}")
-        achievement_name: str = await get_translation(user_id, "achievements", f"{user_stats['achievement_name']}")
+    chat_id: int = callback.message.chat.id
+    message_id: int = callback.message.message_id
+    stats_translation: str = await get_translation(user_id, "messages", "user_stats")
+    user_status: str = await get_translation(user_id, "statuses", f"{user_stats['user_status']}")
+    achievement_name: str = await get_translation(user_id, "achievements", f"{user_stats['achievement_name']}")
+
+    info_caption = stats_translation.format(
+        achievement_name=achievement_name,
+        keys_today=user_stats['keys_today'],
+        keys_total=user_stats['keys_total'],
+        user_status=user_status,
+    )
+    keyboard: InlineKeyboardMarkup = await get_back_to_main_menu_button(user_id)
 
-        info_caption = stats_translation.format(
-            achievement_name=achievement_name,
-            keys_today=user_stats['keys_today'],
-            keys_total=user_stats['keys_total'],
-            user_status=user_status,
+    if callback.message.photo:
+        await bot.edit_message_caption(
+            chat_id=chat_id,
+            message_id=message_id,
+            caption=info_caption,
+            reply_markup=keyboard
+        )
+    else:
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=info_caption,
+            reply_markup=keyboard
         )
-        keyboard: InlineKeyboardMarkup = await get_back_to_main_menu_button(user_id)
-
-        if callback.message.photo:
-            await bot.edit_message_caption(
-                chat_id=chat_id,
-                message_id=message_id,
-                caption=info_caption,
-                reply_markup=keyboard
-            )
-        else:
-            await bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=info_caption,
-                reply_markup=keyboard
-            )
 
 
 @router.callback_query(F.data == "user_info")
 async def info_handler(callback: types.CallbackQuery) -> None:
-    async with await get_session() as session:
-        user_id: int = (
-            callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
-        )
+    user_id: int = (
+        callback.from_user.id if callback.from_user.id != BOT_ID else callback.message.chat.id
+    )
 
-        await log_user_action(session, user_id, "Info opened")
-        await callback.answer()
+    await log_user_action(user_id, "Info opened")
+    await callback.answer()
 
-        chat_id: int = callback.message.chat.id
-        message_id: int = callback.message.message_id
-        info_caption: str = await get_translation(user_id, "messages", "info_description")
-        keyboard: InlineKeyboardMarkup = await get_donation_keyboard(user_id)
+    chat_id: int = callback.message.chat.id
+    message_id: int = callback.message.message_id
+    info_caption: str = await get_translation(user_id, "messages", "info_description")
+    keyboard: InlineKeyboardMarkup = await get_donation_keyboard(user_id)
 
-        if callback.message.photo:
-            await bot.edit_message_caption(
-                chat_id=chat_id,
-                message_id=message_id,
-                caption=info_caption,
-                reply_markup=keyboard
-            )
-        else:
-            await bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=info_caption,
-                reply_markup=keyboard
-            )
+    if callback.message.photo:
+        await bot.edit_message_caption(
+            chat_id=chat_id,
+            message_id=message_id,
+            caption=info_caption,
+            reply_markup=keyboard
+        )
+    else:
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=info_caption,
+            reply_markup=keyboard
+        )
 
 
 # Back to main menu(for settings)
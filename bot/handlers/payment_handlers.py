@@ -12,6 +12,7 @@ from bot.keyboards.back_to_main_kb import get_back_to_main_menu_button
 from bot.keyboards.donate_kb import get_cancel_donation_keyboard, get_payment_keyboard
 from bot.states.form import DonationState
 from bot.utils import get_translation
+from db.database import release_connection
 
 router = Router()
 
@@ -132,6 +133,7 @@ async def refund_stars_command_handler(message: types.Message, state: FSMContext
     refund_transaction_not_found_text: str = await get_translation(user_id, "payment", "refund_transaction_not_found")
     refund_already_processed_text: str = await get_translation(user_id, "payment", "refund_already_processed")
     refund_error_text: str = await get_translation(user_id, "payment", "refund_error")
+    await release_connection()
 
     # Get the transaction number from the command
     transaction_id: str = message.text.split(" ")[1] if len(message.text.split()) > 1 else None
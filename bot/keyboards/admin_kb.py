@@ -1,27 +1,39 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from bot.translations import translation_manager
 from bot.utils import get_translation
+from bot.utils.utils import get_user_language_code
 
-from .back_to_main_kb import get_back_to_main_menu_button
+from .back_to_main_kb import build_back_to_main_menu_button
+from .render_cache import render_cache
 
 
 # Function that returns admin panel
 async def get_admin_panel_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    language_code: str = await get_user_language_code(user_id)
+    return render_cache.get("admin_panel", language_code, build_admin_panel_keyboard)
+
+
+def build_admin_panel_keyboard(language_code: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
-    main_menu_back = await get_back_to_main_menu_button(user_id)
+    main_menu_back = render_cache.get("back_to_main_menu", language_code, build_back_to_main_menu_button)
 
     builder.row(InlineKeyboardButton(
-        text=await get_translation(user_id, "admin", "manage_keys"), callback_data="keys_admin_panel"),
+        text=translation_manager.get_translation(language_code, "admin", "manage_keys"),
+        callback_data="keys_admin_panel"),
         InlineKeyboardButton(
-            text=await get_translation(user_id, "admin", "manage_users"), callback_data="users_admin_panel")
+            text=translation_manager.get_translation(language_code, "admin", "manage_users"),
+            callback_data="users_admin_panel")
     )
     builder.row(InlineKeyboardButton(
-        text=await get_translation(user_id, "admin", "manage_notifications"), callback_data="notifications_admin_panel")
+        text=translation_manager.get_translation(language_code, "admin", "manage_notifications"),
+        callback_data="notifications_admin_panel")
     )
     builder.row(InlineKeyboardButton(
-        text=await get_translation(user_id, "admin", "message_user"), callback_data="send_message_to_user")
+        text=translation_manager.get_translation(language_code, "admin", "message_user"),
+        callback_data="send_message_to_user")
     )
 
     builder.row(*main_menu_back.inline_keyboard[0])
@@ -1,14 +1,22 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.utils import get_translation
+from bot.translations import translation_manager
+from bot.utils.utils import get_user_language_code
+
+from .render_cache import render_cache
 
 
 async def get_back_to_main_menu_button(user_id: int) -> InlineKeyboardMarkup:
+    language_code: str = await get_user_language_code(user_id)
+    return render_cache.get("back_to_main_menu", language_code, build_back_to_main_menu_button)
+
+
+def build_back_to_main_menu_button(language_code: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
     builder.row(InlineKeyboardButton(
-        text=await get_translation(user_id, "buttons", "back"), callback_data="main_menu_back")
+        text=translation_manager.get_translation(language_code, "buttons", "back"), callback_data="main_menu_back")
     )
 
     back_markup = builder.as_markup()
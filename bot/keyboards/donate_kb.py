@@ -2,8 +2,11 @@ from aiogram import types
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.keyboards.back_to_main_kb import get_back_to_main_menu_button
+from bot.keyboards.back_to_main_kb import build_back_to_main_menu_button
+from bot.keyboards.render_cache import render_cache
+from bot.translations import translation_manager
 from bot.utils import get_translation
+from bot.utils.utils import get_user_language_code
 
 
 async def get_payment_keyboard(user_id: int) -> InlineKeyboardMarkup:
@@ -21,8 +24,13 @@ async def get_payment_keyboard(user_id: int) -> InlineKeyboardMarkup:
 
 
 async def get_donation_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    main_menu_back = await get_back_to_main_menu_button(user_id)
-    amount_button = await get_translation(user_id, "buttons", "custom_donate_amount")
+    language_code: str = await get_user_language_code(user_id)
+    return render_cache.get("donation", language_code, build_donation_keyboard)
+
+
+def build_donation_keyboard(language_code: str) -> InlineKeyboardMarkup:
+    main_menu_back = render_cache.get("back_to_main_menu", language_code, build_back_to_main_menu_button)
+    amount_button = translation_manager.get_translation(language_code, "buttons", "custom_donate_amount")
     builder = InlineKeyboardBuilder()
 
     builder.row(
@@ -1,18 +1,26 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.utils import get_translation
+from bot.translations import translation_manager
 from bot.utils.referals import REFERRAL_LINKS
+from bot.utils.utils import get_user_language_code
 
-from .back_to_main_kb import get_back_to_main_menu_button
+from .back_to_main_kb import build_back_to_main_menu_button
+from .render_cache import render_cache
 
 
 # Buttons that returns the button bar
 async def get_action_buttons(user_id: int) -> InlineKeyboardMarkup:
+    language_code: str = await get_user_language_code(user_id)
+    return render_cache.get("action_buttons", language_code, build_action_buttons)
+
+
+def build_action_buttons(language_code: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
     builder.row(InlineKeyboardButton(
-            text=await get_translation(user_id, "buttons", "referral_links"), callback_data="referral_links")
+            text=translation_manager.get_translation(language_code, "buttons", "referral_links"),
+            callback_data="referral_links")
     )
     builder.row(InlineKeyboardButton(text="🎰 GAMECENTER", url=REFERRAL_LINKS.get('🎰 GAMECENTER')))
 
@@ -26,18 +34,21 @@ async def get_action_buttons(user_id: int) -> InlineKeyboardMarkup:
         width=2
     )
     builder.row(InlineKeyboardButton(
-            text=await get_translation(user_id, "buttons", "get_regular_keys"), callback_data="keys_regular")
+            text=translation_manager.get_translation(language_code, "buttons", "get_regular_keys"),
+            callback_data="keys_regular")
     )
     builder.row(InlineKeyboardButton(
-            text=await get_translation(user_id, "buttons", "settings"), callback_data="settings_menu"
+            text=translation_manager.get_translation(language_code, "buttons", "settings"),
+            callback_data="settings_menu"
         ),
         InlineKeyboardButton(
-            text=await get_translation(user_id, "buttons", "user_stats"), callback_data="user_stats")
+            text=translation_manager.get_translation(language_code, "buttons", "user_stats"),
+            callback_data="user_stats")
     )
 
     builder.row(
         InlineKeyboardButton(
-            text=await get_translation(user_id, "buttons", "info"), callback_data="user_info"
+            text=translation_manager.get_translation(language_code, "buttons", "info"), callback_data="user_info"
         )
     )
     menu_markup = builder.as_markup()
@@ -46,12 +57,18 @@ async def get_action_buttons(user_id: int) -> InlineKeyboardMarkup:
 
 # Buttons that returns settings menu
 async def get_settings_menu(user_id: int) -> InlineKeyboardMarkup:
+    language_code: str = await get_user_language_code(user_id)
+    return render_cache.get("settings_menu", language_code, build_settings_menu)
+
+
+def build_settings_menu(language_code: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
-    main_menu_back = await get_back_to_main_menu_button(user_id)
+    main_menu_back = render_cache.get("back_to_main_menu", language_code, build_back_to_main_menu_button)
 
     builder.row(InlineKeyboardButton(
-            text=await get_translation(user_id, "common", "choose_language"), callback_data="settings_choose_language"),
+            text=translation_manager.get_translation(language_code, "common", "choose_language"),
+            callback_data="settings_choose_language"),
     )
     builder.row(*main_menu_back.inline_keyboard[0])
 
@@ -1,18 +1,25 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from bot.utils.referals import REFERRAL_LINKS
+from bot.utils.utils import get_user_language_code
 
-from .back_to_main_kb import get_back_to_main_menu_button
+from .back_to_main_kb import build_back_to_main_menu_button
+from .render_cache import render_cache
 
 
 async def referral_links_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    main_menu_back = await get_back_to_main_menu_button(user_id)
+    language_code: str = await get_user_language_code(user_id)
+    return render_cache.get("referral_links", language_code, build_referral_links_keyboard)
+
+
+def build_referral_links_keyboard(language_code: str) -> InlineKeyboardMarkup:
+    main_menu_back = render_cache.get("back_to_main_menu", language_code, build_back_to_main_menu_button)
     buttons = []
     for game_name, game_url in REFERRAL_LINKS.items():
         buttons.append(
             InlineKeyboardButton(text=game_name, url=game_url))
-    keyboard_markup = InlineKeyboardMarkup(
-        inline_keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)]
-    )
-    keyboard_markup.inline_keyboard.append(main_menu_back.inline_keyboard[0])
+
+    # The back button row is copied, the cached markup it comes from is shared
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard_markup = InlineKeyboardMarkup(inline_keyboard=rows + [list(main_menu_back.inline_keyboard[0])])
     return keyboard_markup
@@ -0,0 +1,33 @@
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from bot.translations import translation_manager
+from bot.utils.referals import REFERRAL_LINKS
+
+T = TypeVar('T')
+
+
+class RenderCache:
+    """
+    Keeps screens that are identical for every user of a language, built once per language.
+    Cached markups are shared between users and must not be modified: build a new keyboard
+    from their rows instead.
+    """
+
+    def __init__(self) -> None:
+        self._screens: Dict[Tuple[str, str], Any] = {}
+        self._version: Optional[Tuple[int, int]] = None
+
+    def get(self, name: str, language_code: str, build: Callable[[str], T]) -> T:
+        # Screens are rebuilt after translations are reloaded or referral links change
+        version: Tuple[int, int] = (translation_manager.version, hash(tuple(REFERRAL_LINKS.items())))
+        if version != self._version:
+            self._screens.clear()
+            self._version = version
+
+        screen = self._screens.get((name, language_code))
+        if screen is None:
+            screen = self._screens[(name, language_code)] = build(language_code)
+        return screen
+
+
+render_cache = RenderCache()
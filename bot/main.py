@@ -1,38 +1,157 @@
 import asyncio
+import multiprocessing
+import signal
 
 from aiogram import Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
-from bot.bot_config import bot, logger
+from bot.bot_config import (
+    BOT_MODE,
+    BOT_WORKERS,
+    UPDATE_CONCURRENCY,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+    WEBHOOK_WORKERS,
+    bot,
+    logger,
+)
+from bot.db_handler.admin_roster import admin_roster
+from bot.db_handler.key_claim_service import key_claim_service
+from bot.db_handler.partitions import partition_maintenance
+from bot.db_handler.user_counters import user_counters
+from bot.db_handler.user_log_writer import user_log_writer
 from bot.handlers import register_handlers
+from bot.handlers.command_setup import register_commands
+from bot.middlewares.admission_middleware import AdmissionMiddleware
 from bot.middlewares.ban_check_middleware import BanCheckMiddleware
+from bot.middlewares.db_session_middleware import DbSessionMiddleware
+from bot.middlewares.image_upload_middleware import ImageUploadMiddleware
+from bot.middlewares.rate_governor_middleware import rate_governor
+from bot.middlewares.user_serial_middleware import UserSerialMiddleware
+from bot.translations import translation_manager
+from bot.utils.broadcaster import broadcaster
+from bot.utils.image_registry import image_registry
+from bot.utils.load_monitor import load_monitor
+from config.logging_config import use_worker_log_file
 from config.redis_config import redis_manager
 
 
-async def main():
+# Receiving updates from Telegram through the webhook
+async def run_webhook(dp: Dispatcher, worker_index: int) -> None:
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    # Workers share the port, only the first one registers the webhook
+    if worker_index == 0:
+        await bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT, reuse_port=WEBHOOK_WORKERS > 1).start()
+        logger.info(f"✅ | Worker {worker_index} is serving the webhook on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def main(worker_index: int = 0):
     client = await redis_manager.get_client()
     try:
         logger.info("✅ | Starting the bot and initialising the Redis")
 
         dp = Dispatcher(storage=RedisStorage(client, state_ttl=600))
 
+        translation_manager.load_all()
+        await image_registry.load()
+        await admin_roster.refresh()
+
+        # Bot images are sent by file id once they have been uploaded
+        bot.session.middleware(ImageUploadMiddleware())
+        # Every request to a chat is paced to Telegram's limits
+        bot.session.middleware(rate_governor)
+
+        # Button presses are answered right away while the bot is overloaded
+        dp.update.middleware(AdmissionMiddleware(load_monitor))
+        # Updates wait for the previous update of their user before taking a database session
+        dp.update.middleware(UserSerialMiddleware(UPDATE_CONCURRENCY))
+        dp.update.middleware(DbSessionMiddleware())
         dp.update.middleware(BanCheckMiddleware())
         register_handlers(dp)
 
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        # Commands are registered once per language, by the first worker
+        if worker_index == 0:
+            await register_commands(bot)
+
+        load_monitor.start()
+        rate_governor.start()
+        key_claim_service.start()
+        partition_maintenance.start()
+        user_log_writer.start()
+        user_counters.start()
+        broadcaster.start()
+        admin_roster.start()
+
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, worker_index)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
 
     finally:
+        await broadcaster.stop()
+        await key_claim_service.stop()
+        await partition_maintenance.stop()
+        await user_log_writer.stop()
+        await user_counters.stop()
+        await admin_roster.stop()
+        await load_monitor.stop()
+        await rate_governor.stop()
+
         logger.info("📁 Closing the database and Redis connections")
         await redis_manager.close()
 
-if __name__ == '__main__':
+
+def run(worker_index: int = 0) -> None:
+    if worker_index > 0:
+        use_worker_log_file(worker_index)
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(main())
+        loop.run_until_complete(main(worker_index))
         loop.run_until_complete(loop.shutdown_asyncgens())
     except KeyboardInterrupt:
         logger.info("🛑 | Bot application is terminated by the `Ctrl+C` signal")
     finally:
         logger.info("🏁 | Bot application stopped!")
+
+
+if __name__ == '__main__':
+    # In webhook mode extra worker processes are started, each with its own connections
+    workers = [
+        multiprocessing.Process(target=run, args=(worker_index,))
+        for worker_index in range(1, BOT_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+
+    run()
+
+    for worker in workers:
+        worker.terminate()
+        worker.join()
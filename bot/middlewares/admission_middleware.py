@@ -0,0 +1,52 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from bot.bot_config import logger
+from bot.db_handler.user_profile_cache import UserProfile, get_cached_profile
+from bot.translations import translation_manager
+from bot.utils.load_monitor import LoadMonitor
+from bot.utils.static_data import SUPPORTED_LANGUAGES
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """
+    Answers button presses right away with a "busy, try again" notice while the bot is overloaded,
+    instead of letting them queue for a database connection.
+    Premium users are only turned away once the load reaches `premium_pressure`.
+    Messages and commands are always handled.
+    """
+
+    def __init__(self, monitor: LoadMonitor, premium_pressure: float = 2.0) -> None:
+        self.monitor = monitor
+        self.premium_pressure = premium_pressure
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        pressure: float = self.monitor.pressure
+        user: Optional[User] = data.get('event_from_user')
+        if pressure < 1.0 or event.callback_query is None or user is None:
+            return await handler(event, data)
+
+        # Only the cached profile is read, the database is what is overloaded
+        profile: Optional[UserProfile] = await get_cached_profile(user.id)
+        if profile and profile.user_status == 'premium' and pressure < self.premium_pressure:
+            return await handler(event, data)
+
+        try:
+            await event.callback_query.answer(self.busy_text(user, profile))
+        except Exception as e:
+            logger.error(f"Error answering a callback while overloaded: {e}")
+        return None
+
+    @staticmethod
+    def busy_text(user: User, profile: Optional[UserProfile]) -> str:
+        language_code: Optional[str] = profile.language_code if profile else None
+        if language_code not in SUPPORTED_LANGUAGES:
+            language_code = user.language_code if user.language_code in SUPPORTED_LANGUAGES else 'en'
+        return translation_manager.get_translation(language_code, "messages", "server_busy")
@@ -1,9 +1,12 @@
+from typing import Optional
+
 from aiogram import BaseMiddleware, types
 from aiogram.types import Update
 
-from bot.db_handler.db_service import get_user_status_info
+from bot.db_handler.db_service import get_user_profile
+from bot.db_handler.user_profile_cache import UserProfile
 from bot.handlers.handlers import banned_user_handler
-from db.database import get_session
+from db.database import session_scope
 
 
 class BanCheckMiddleware(BaseMiddleware):
@@ -13,21 +16,28 @@ class BanCheckMiddleware(BaseMiddleware):
             user_id = event.callback_query.from_user.id
 
             # Ban check
-            async with await get_session() as session:
-                user_info = await get_user_status_info(session, user_id)
-                if user_info and user_info.is_banned:
-                    await banned_user_handler(event.callback_query.message)
-                    return
+            user_info = await self.get_profile(user_id, data)
+            if user_info and user_info.is_banned:
+                await banned_user_handler(event.callback_query.message)
+                return
 
         # Check if the event is a command
         elif isinstance(event.message, types.Message) and event.message.text and event.message.text.startswith('/'):
             user_id = event.message.from_user.id
 
             # Ban check
-            async with await get_session() as session:
-                user_info = await get_user_status_info(session, user_id)
-                if user_info and user_info.is_banned:
-                    await banned_user_handler(event.message)
-                    return
+            user_info = await self.get_profile(user_id, data)
+            if user_info and user_info.is_banned:
+                await banned_user_handler(event.message)
+                return
 
         return await handler(event, data)
+
+    @staticmethod
+    async def get_profile(user_id: int, data) -> Optional[UserProfile]:
+        # The profile loaded by the session middleware is reused
+        profile: Optional[UserProfile] = data.get('user_profile')
+        if profile and profile.user_id == user_id:
+            return profile
+        async with session_scope() as session:
+            return await get_user_profile(session, user_id)
@@ -0,0 +1,39 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from bot.db_handler.db_service import get_user_profile
+from bot.db_handler.user_profile_cache import UserProfile
+from db.database import AsyncSessionLocal, current_session, release_connection
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Opens one session per update and loads the profile of the user who sent it.
+    Both are passed to handlers as `session` and `user_profile`, helpers reach the session
+    through `session_scope()`.
+    The session only takes a connection from the pool when it runs a query, and gives it back after
+    the profile lookup and wherever a handler calls `release_connection()` before waiting.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        async with AsyncSessionLocal() as session:
+            session_token = current_session.set(session)
+            data['session'] = session
+
+            user: Optional[User] = data.get('event_from_user')
+            profile: Optional[UserProfile] = await get_user_profile(session, user.id) if user else None
+            # The lookup only read, handlers that don't query don't hold a connection
+            await release_connection()
+            data['user_profile'] = profile
+
+            try:
+                return await handler(event, data)
+            finally:
+                current_session.reset(session_token)
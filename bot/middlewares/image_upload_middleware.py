@@ -0,0 +1,65 @@
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageMedia, Response, SendPhoto, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from bot.bot_config import logger
+from bot.utils.image_registry import image_registry
+
+# Parts of the errors Telegram returns when it doesn't accept a file id
+FILE_ID_ERRORS = ("wrong file identifier", "file_id", "wrong remote file", "failed to get http url content")
+
+
+class ImageUploadMiddleware(BaseRequestMiddleware):
+    """Sends bot images by their file id once they have been uploaded and records the file id of new uploads"""
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        path: Optional[str] = self.get_photo_path(method)
+        if path is None:
+            return await make_request(bot, method)
+
+        file_id: Optional[str] = image_registry.get_file_id(path)
+        if file_id:
+            try:
+                return await make_request(bot, self.with_photo(method, file_id))
+            except TelegramBadRequest as e:
+                # Other errors, such as an edit of a deleted message, would fail again with the upload
+                if not self.is_file_id_error(e):
+                    raise
+                # The file id is no longer accepted, the image is uploaded again
+                logger.warning(f"Cached file id of {path} was rejected: {e}")
+                image_registry.forget(path)
+
+        response: Response[TelegramType] = await make_request(bot, method)
+        if isinstance(response.result, Message) and response.result.photo:
+            await image_registry.remember(path, response.result.photo[-1].file_id)
+        return response
+
+    @staticmethod
+    def is_file_id_error(error: TelegramBadRequest) -> bool:
+        message: str = error.message.lower()
+        return any(text in message for text in FILE_ID_ERRORS)
+
+    @staticmethod
+    def get_photo_path(method: TelegramMethod) -> Optional[str]:
+        if isinstance(method, SendPhoto) and isinstance(method.photo, FSInputFile):
+            return method.photo.path
+        if (isinstance(method, EditMessageMedia) and isinstance(method.media, InputMediaPhoto)
+                and isinstance(method.media.media, FSInputFile)):
+            return method.media.media.path
+        return None
+
+    @staticmethod
+    def with_photo(method: TelegramMethod, file_id: str) -> TelegramMethod:
+        if isinstance(method, SendPhoto):
+            return method.model_copy(update={'photo': file_id})
+        return method.model_copy(update={'media': method.media.model_copy(update={'media': file_id})})
@@ -0,0 +1,319 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from bot.bot_config import BOT_WORKERS, logger
+from config.redis_config import redis_manager as redis_client
+
+# Set by bulk senders such as the broadcaster, their requests give way to those of users
+background_requests: ContextVar[bool] = ContextVar('background_requests', default=False)
+
+# Token buckets shared by all workers and instances of the bot
+CHAT_BUCKET_KEY = "telegram:rate:chat:{}"
+GLOBAL_BUCKET_KEY = "telegram:rate:global"
+
+# Bucket state is a hash of tokens, refill time and the end of a flood pause, in seconds of the Redis clock.
+# A bucket expires once it would be full again, so idle chats don't stay in Redis.
+BUCKET_FUNCTIONS = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local function load(key, rate, capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'updated', 'paused_until')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    if now > updated then
+        tokens = math.min(capacity, tokens + (now - updated) * rate)
+        updated = now
+    end
+    return tokens, updated, tonumber(state[3]) or 0
+end
+local function save(key, rate, capacity, tokens, updated, paused_until)
+    redis.call('HSET', key, 'tokens', tokens, 'updated', updated, 'paused_until', paused_until)
+    local full_in = (capacity - tokens) / rate + math.max(paused_until - now, 0)
+    redis.call('EXPIRE', key, math.ceil(full_in) + 60)
+end
+"""
+
+# Takes a token from the chat's bucket and from the bot-wide bucket.
+# KEYS: chat bucket, bot-wide bucket. ARGV: chat rate, chat burst, bot-wide rate, bot-wide burst,
+# bot-wide tokens the request has to leave for others.
+# Returns {0, ms to wait for the tokens}, or {1, ms to wait} when too few bot-wide tokens are left
+# and nothing was taken.
+RESERVE_SCRIPT = BUCKET_FUNCTIONS + """
+local chat_rate, chat_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local bot_rate, bot_burst, keep = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local chat_tokens, chat_updated, chat_paused = load(KEYS[1], chat_rate, chat_burst)
+local bot_tokens, bot_updated, bot_paused = load(KEYS[2], bot_rate, bot_burst)
+if keep > 0 then
+    local wait = math.max((keep + 1 - bot_tokens) / bot_rate, bot_paused - now)
+    if wait > 0 then
+        return {1, math.ceil(wait * 1000)}
+    end
+end
+chat_tokens = chat_tokens - 1
+bot_tokens = bot_tokens - 1
+save(KEYS[1], chat_rate, chat_burst, chat_tokens, chat_updated, chat_paused)
+save(KEYS[2], bot_rate, bot_burst, bot_tokens, bot_updated, bot_paused)
+local wait = math.max(-chat_tokens / chat_rate, chat_paused - now, -bot_tokens / bot_rate, bot_paused - now, 0)
+return {0, math.ceil(wait * 1000)}
+"""
+
+# Pauses buckets for a flood limit. KEYS: buckets. ARGV: seconds, then the rate and burst of every bucket.
+PAUSE_SCRIPT = BUCKET_FUNCTIONS + """
+local paused_until = now + tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local tokens, updated, paused = load(key, rate, capacity)
+    save(key, rate, capacity, tokens, updated, math.max(paused, paused_until))
+end
+return 1
+"""
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `capacity` requests"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens: float = capacity
+        self.updated: float = time.monotonic()
+        self.paused_until: float = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self) -> float:
+        """Taking a token and returning how long to wait for it, waiting requests are served in order"""
+        now: float = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, self.paused_until - now, 0.0)
+
+    def wait_time(self, keep: float) -> float:
+        """Time until a token can be taken while leaving `keep` tokens for other requests"""
+        now: float = time.monotonic()
+        self._refill(now)
+        return max((keep + 1 - self.tokens) / self.rate, self.paused_until - now, 0.0)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and self.paused_until <= self.updated
+
+
+class RateGovernorMiddleware(BaseRequestMiddleware):
+    """
+    Keeps the bot's requests within Telegram's limits: every request to a chat takes a token
+    from the chat's bucket and from the bot-wide bucket, and waits when they are empty.
+    The buckets are kept in Redis, so the limits hold across all workers and instances.
+    While Redis is unavailable every process falls back to buckets of its own, with the bot-wide
+    rate split between the workers of the instance; several instances can then exceed it.
+    Background requests only take bot-wide tokens while `background_reserve` of them are left,
+    so a mailing doesn't delay the answers to users.
+    When Telegram answers with RetryAfter the chat, and for background requests the whole bot,
+    waits `retry_after` seconds; the request is sent again unless it ran out of retries.
+    """
+
+    def __init__(
+            self,
+            global_rate: float = 30.0,
+            chat_rate: float = 1.0,
+            chat_burst: float = 5.0,
+            group_rate: float = 20 / 60,
+            background_reserve: Optional[float] = None,
+            max_retries: int = 3,
+            max_retry_after: float = 60.0,
+            stats_interval: float = 60.0,
+    ) -> None:
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        # A sixth of the bot-wide rate is kept for users by default
+        self.background_reserve = global_rate / 6 if background_reserve is None else background_reserve
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.stats_interval = stats_interval
+        # Buckets of this process, used while Redis is unavailable
+        self.global_bucket = TokenBucket(global_rate / BOT_WORKERS, global_rate / BOT_WORKERS)
+        self.chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._next_prune: float = 0.0
+        self._reserve_script = None
+        self._pause_script = None
+        self._reporter: Optional[asyncio.Task] = None
+        # Queue depth, exposed through `stats` and logged every `stats_interval`
+        self.waiting: int = 0
+        self.waiting_background: int = 0
+        self.retries: int = 0
+        self.fallbacks: int = 0
+
+    def start(self) -> None:
+        """Starting the periodic report of the queue depth"""
+        if self._reporter and not self._reporter.done():
+            return
+        self._reporter = asyncio.create_task(self._report())
+        logger.info("✅ Rate governor started")
+
+    async def stop(self) -> None:
+        if self._reporter and not self._reporter.done():
+            self._reporter.cancel()
+            try:
+                await self._reporter
+            except asyncio.CancelledError:
+                pass
+        self._reporter = None
+        logger.info("📁 Rate governor stopped")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'waiting': self.waiting,
+            'waiting_background': self.waiting_background,
+            'retries': self.retries,
+            'fallbacks': self.fallbacks,
+        }
+
+    async def _report(self) -> None:
+        reported: Dict[str, int] = self.stats
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            stats: Dict[str, int] = self.stats
+            # Nothing is logged while the bot is idle
+            if stats == reported and not stats['waiting']:
+                continue
+            reported = stats
+            logger.info(
+                f"Telegram requests waiting: {stats['waiting']} ({stats['waiting_background']} background), "
+                f"flood retries: {stats['retries']}, requests paced without Redis: {stats['fallbacks']}"
+            )
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id: Optional[Union[int, str]] = getattr(method, 'chat_id', None)
+        # Requests that don't go to a chat, such as answering callbacks or receiving updates, aren't limited
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        background: bool = background_requests.get()
+        attempt: int = 0
+        while True:
+            await self._acquire(chat_id, background)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                # Later requests wait even when this one gives up
+                await self._pause(chat_id, background, e.retry_after)
+
+                attempt += 1
+                if attempt > self.max_retries or e.retry_after > self.max_retry_after:
+                    raise
+                self.retries += 1
+                logger.warning(
+                    f"Flood limit reached for chat {chat_id}, retrying {method.__api_method__} "
+                    f"in {e.retry_after} sec ({self.waiting} requests waiting)"
+                )
+
+    async def _acquire(self, chat_id: Union[int, str], background: bool) -> None:
+        self.waiting += 1
+        if background:
+            self.waiting_background += 1
+        try:
+            try:
+                await self._acquire_shared(chat_id, background)
+            except Exception as e:
+                logger.error(f"Error pacing a request in Redis, using the local limits: {e}")
+                self.fallbacks += 1
+                await self._acquire_local(chat_id, background)
+        finally:
+            self.waiting -= 1
+            if background:
+                self.waiting_background -= 1
+
+    async def _acquire_shared(self, chat_id: Union[int, str], background: bool) -> None:
+        client = await redis_client.get_client()
+        if self._reserve_script is None:
+            self._reserve_script = client.register_script(RESERVE_SCRIPT)
+
+        keep: float = self.background_reserve if background else 0
+        while True:
+            held_back, delay = await self._reserve_script(
+                keys=[CHAT_BUCKET_KEY.format(chat_id), GLOBAL_BUCKET_KEY],
+                args=[self._chat_rate(chat_id), self.chat_burst, self.global_rate, self.global_rate, keep],
+            )
+            if delay:
+                await asyncio.sleep(delay / 1000)
+            if not held_back:
+                return
+
+    async def _acquire_local(self, chat_id: Union[int, str], background: bool) -> None:
+        delay: float = self._chat_bucket(chat_id).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if background:
+            while delay := self.global_bucket.wait_time(self.background_reserve):
+                await asyncio.sleep(delay)
+        delay = self.global_bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _pause(self, chat_id: Union[int, str], background: bool, seconds: float) -> None:
+        """Pausing the chat, and for background requests the whole bot, for a flood limit"""
+        self._chat_bucket(chat_id).pause(seconds)
+        # Flood limits hit by mailings apply to the whole bot
+        if background:
+            self.global_bucket.pause(seconds)
+
+        keys: List[str] = [CHAT_BUCKET_KEY.format(chat_id)]
+        args: List[float] = [seconds, self._chat_rate(chat_id), self.chat_burst]
+        if background:
+            keys.append(GLOBAL_BUCKET_KEY)
+            args.extend([self.global_rate, self.global_rate])
+        try:
+            client = await redis_client.get_client()
+            if self._pause_script is None:
+                self._pause_script = client.register_script(PAUSE_SCRIPT)
+            await self._pause_script(keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"Error pausing requests in Redis: {e}")
+
+    def _chat_rate(self, chat_id: Union[int, str]) -> float:
+        # Group chats and channels have negative ids or usernames and a lower limit
+        is_private: bool = isinstance(chat_id, int) and chat_id > 0
+        return self.chat_rate if is_private else self.group_rate
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket: Optional[TokenBucket] = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            self._prune()
+            bucket = TokenBucket(self._chat_rate(chat_id), self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune(self) -> None:
+        """Forgetting the buckets of chats that haven't been sent anything for a while"""
+        now: float = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        for chat_id in [chat_id for chat_id, bucket in self.chat_buckets.items() if bucket.is_idle()]:
+            del self.chat_buckets[chat_id]
+
+
+rate_governor = RateGovernorMiddleware()
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from bot.bot_config import logger
+from config.redis_config import redis_manager as redis_client
+
+# Marks a button press that is being handled, shared by all workers and bot instances
+IN_FLIGHT_KEY = "updates:in_flight:{}:{}"
+# Bounds how long a crashed worker can block a button
+IN_FLIGHT_TTL = 60
+
+
+class UserSerialMiddleware(BaseMiddleware):
+    """
+    Handles the updates of one user one after another, in the order they arrived,
+    while the updates of different users run concurrently up to `max_concurrency`.
+    A button pressed again while its first press is still handled is answered and dropped,
+    so a double click can't claim keys twice.
+    """
+
+    def __init__(self, max_concurrency: int = 100) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # User id -> lock and the number of updates holding or waiting for it
+        self._locks: Dict[int, Tuple[asyncio.Lock, int]] = {}
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get('event_from_user')
+        if user is None:
+            async with self._semaphore:
+                return await handler(event, data)
+
+        in_flight_key: Optional[str] = None
+        if event.callback_query is not None:
+            in_flight_key = IN_FLIGHT_KEY.format(user.id, event.callback_query.data)
+            if not await self._mark_in_flight(in_flight_key):
+                await self._drop_duplicate(event)
+                return None
+
+        try:
+            async with self._user_lock(user.id), self._semaphore:
+                return await handler(event, data)
+        finally:
+            if in_flight_key is not None:
+                await self._clear_in_flight(in_flight_key)
+
+    def _user_lock(self, user_id: int) -> "_UserLock":
+        lock, holders = self._locks.get(user_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[user_id] = (lock, holders + 1)
+        return _UserLock(self, user_id, lock)
+
+    def _release_user(self, user_id: int) -> None:
+        """Forgetting the lock of a user once no update holds or waits for it"""
+        lock, holders = self._locks[user_id]
+        if holders > 1:
+            self._locks[user_id] = (lock, holders - 1)
+        else:
+            del self._locks[user_id]
+
+    @staticmethod
+    async def _mark_in_flight(key: str) -> bool:
+        try:
+            client = await redis_client.get_client()
+            return bool(await client.set(key, 1, nx=True, ex=IN_FLIGHT_TTL))
+        except Exception as e:
+            # Without Redis the update is still serialized within this worker
+            logger.error(f"Error marking the update as in flight: {e}")
+            return True
+
+    @staticmethod
+    async def _clear_in_flight(key: str) -> None:
+        try:
+            client = await redis_client.get_client()
+            await client.delete(key)
+        except Exception as e:
+            logger.error(f"Error clearing the in flight update: {e}")
+
+    @staticmethod
+    async def _drop_duplicate(event: Update) -> None:
+        """Stopping the button's loading indicator, the first press shows the result"""
+        try:
+            await event.callback_query.answer()
+        except Exception as e:
+            logger.error(f"Error answering a duplicate callback: {e}")
+
+
+class _UserLock:
+    """Holds the lock of one user for the duration of an update"""
+
+    def __init__(self, middleware: UserSerialMiddleware, user_id: int, lock: asyncio.Lock) -> None:
+        self._middleware = middleware
+        self._user_id = user_id
+        self._lock = lock
+
+    async def __aenter__(self) -> None:
+        try:
+            await self._lock.acquire()
+        except BaseException:
+            self._middleware._release_user(self._user_id)
+            raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._lock.release()
+        self._middleware._release_user(self._user_id)
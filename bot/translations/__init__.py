@@ -1 +1 @@
-from .translation_manager import TranslationManager  # noqa: F401
+from .translation_manager import TranslationManager, translation_manager  # noqa: F401
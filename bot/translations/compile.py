@@ -0,0 +1,7 @@
+from .compiled_catalog import CATALOG_PATH, compile_catalog
+from .translation_manager import TRANSLATIONS_DIR
+
+# Compiling the locale files into the catalog the bot workers memory-map, run as `python -m bot.translations.compile`
+if __name__ == '__main__':
+    language_count, key_count = compile_catalog(TRANSLATIONS_DIR, CATALOG_PATH)
+    print(f"Compiled {key_count} keys for {language_count} languages into {CATALOG_PATH}")
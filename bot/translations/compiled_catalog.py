@@ -0,0 +1,136 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'catalog.bin')
+
+MAGIC = b'HTRC'
+FORMAT_VERSION = 1
+# Magic, format version, number of languages, number of keys, digest of the locale files
+HEADER = struct.Struct('<4sHHI32s')
+# Offset of a language's text table
+LANGUAGE_ENTRY = struct.Struct('<I')
+# Offset and length of a text, the length is MISSING when the language has no such key
+TEXT_ENTRY = struct.Struct('<II')
+MISSING = 0xFFFFFFFF
+
+
+def source_digest(translations_dir: str) -> bytes:
+    """Hashing the locale files, a catalog built from other files is not used"""
+    digest = hashlib.sha256()
+    for filename in sorted(f for f in os.listdir(translations_dir) if f.endswith('.json')):
+        digest.update(filename.encode('utf-8'))
+        with open(os.path.join(translations_dir, filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def _pack_string(value: str) -> bytes:
+    encoded: bytes = value.encode('utf-8')
+    return struct.pack('<H', len(encoded)) + encoded
+
+
+def compile_catalog(translations_dir: str, path: str = CATALOG_PATH) -> Tuple[int, int]:
+    """
+    Compiling the locale files into one binary catalog.
+    Keys are stored once for all languages, and every distinct text is stored once.
+    Returns the number of languages and keys.
+    """
+    translations: Dict[str, Dict[Tuple[str, str], str]] = {}
+    for filename in sorted(f for f in os.listdir(translations_dir) if f.endswith('.json')):
+        with open(os.path.join(translations_dir, filename), 'r', encoding='utf-8') as f:
+            translations[filename.split('.')[0]] = {
+                (category, key): text for category, texts in json.load(f).items() for key, text in texts.items()
+            }
+
+    keys: List[Tuple[str, str]] = sorted({key for texts in translations.values() for key in texts})
+    languages: List[str] = list(translations)
+
+    head: bytes = b''.join(_pack_string(language_code) for language_code in languages)
+    head += b''.join(_pack_string(category) + _pack_string(key) for category, key in keys)
+    tables_start: int = HEADER.size + LANGUAGE_ENTRY.size * len(languages) + len(head)
+    strings_start: int = tables_start + TEXT_ENTRY.size * len(keys) * len(languages)
+
+    strings = bytearray()
+    offsets: Dict[str, Tuple[int, int]] = {}
+    tables = bytearray()
+    for language_code in languages:
+        for key in keys:
+            text: Optional[str] = translations[language_code].get(key)
+            if text is None:
+                tables += TEXT_ENTRY.pack(0, MISSING)
+                continue
+            if text not in offsets:
+                encoded: bytes = text.encode('utf-8')
+                offsets[text] = (strings_start + len(strings), len(encoded))
+                strings += encoded
+            tables += TEXT_ENTRY.pack(*offsets[text])
+
+    table_size: int = TEXT_ENTRY.size * len(keys)
+    temporary_path: str = f"{path}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(languages), len(keys), source_digest(translations_dir)))
+        for index in range(len(languages)):
+            f.write(LANGUAGE_ENTRY.pack(tables_start + table_size * index))
+        f.write(head)
+        f.write(tables)
+        f.write(strings)
+    os.replace(temporary_path, path)
+    return len(languages), len(keys)
+
+
+class CompiledCatalog:
+    """
+    Read-only view of a compiled catalog.
+    The file is memory-mapped, so worker processes share its pages; only the key index is kept
+    per process, and texts are decoded when they are requested.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, language_count, key_count, self.digest = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a translation catalog of version {FORMAT_VERSION}")
+
+        position: int = HEADER.size
+        table_offsets: List[int] = []
+        for _ in range(language_count):
+            table_offsets.append(LANGUAGE_ENTRY.unpack_from(self._mmap, position)[0])
+            position += LANGUAGE_ENTRY.size
+
+        # Table offset of every language
+        self.languages: Dict[str, int] = {}
+        for table_offset in table_offsets:
+            language_code, position = self._read_string(position)
+            self.languages[language_code] = table_offset
+
+        # Index of every (category, key) in the text tables
+        self.keys: Dict[Tuple[str, str], int] = {}
+        for index in range(key_count):
+            category, position = self._read_string(position)
+            key, position = self._read_string(position)
+            self.keys[(category, key)] = index
+
+    def _read_string(self, position: int) -> Tuple[str, int]:
+        (length,) = struct.unpack_from('<H', self._mmap, position)
+        start: int = position + 2
+        return self._mmap[start:start + length].decode('utf-8'), start + length
+
+    def get(self, language_code: str, category: str, key: str) -> Optional[str]:
+        table_offset: Optional[int] = self.languages.get(language_code)
+        index: Optional[int] = self.keys.get((category, key))
+        if table_offset is None or index is None:
+            return None
+        offset, length = TEXT_ENTRY.unpack_from(self._mmap, table_offset + TEXT_ENTRY.size * index)
+        if length == MISSING:
+            return None
+        return self._mmap[offset:offset + length].decode('utf-8')
+
+    def close(self) -> None:
+        self._mmap.close()
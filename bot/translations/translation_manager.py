@@ -1,14 +1,41 @@
 import json
+import logging
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-from bot.bot_config import logger
+from .compiled_catalog import CATALOG_PATH, CompiledCatalog, source_digest
+
+# The bot logger, taken by name so the catalog can be compiled without the bot configuration
+logger = logging.getLogger('bot')
+
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(__file__), 'locales')
 
 
 class TranslationManager:
-    def __init__(self, translations_dir: str) -> None:
+    def __init__(self, translations_dir: str, catalog_path: str = CATALOG_PATH) -> None:
         self.translations_dir = translations_dir
+        self.catalog_path = catalog_path
+        # Memory-mapped catalog compiled from the locale files, the JSON files are read when it is missing
+        self.compiled: Optional[CompiledCatalog] = None
+        self._compiled_checked: bool = False
         self.cache = {}
+        # Flattened lookup tables: language code -> (category, key) -> text
+        self.catalog: Dict[str, Dict[Tuple[str, str], str]] = {}
+        self._available_languages: Optional[List[str]] = None
+        # Changes whenever the translations are (re)loaded, so rendered screens can be rebuilt
+        self.version: int = 0
+
+    def load_all(self) -> None:
+        """Opening the compiled catalog, or loading and flattening the translations of every available language"""
+        if self._open_compiled():
+            self.version += 1
+            logger.info(f"✅ Translations loaded for {len(self.compiled.languages)} languages from the compiled catalog")
+            return
+
+        for language_code in self.get_available_languages():
+            self._build_catalog(language_code)
+        self.version += 1
+        logger.info(f"✅ Translations loaded for {len(self.catalog)} languages")
 
     def load_translations(self, language_code: str) -> Dict[str, Dict[str, str]]:
         """Loading translations by language code with caching"""
@@ -32,9 +59,56 @@ class TranslationManager:
 
     def get_translation(self, language_code: str, category: str, key: str) -> str:
         """Getting translation by key and category"""
-        translations = self.load_translations(language_code)
-        return translations.get(category, {}).get(key, key)
+        if self._open_compiled():
+            text: Optional[str] = self.compiled.get(language_code, category, key)
+            return key if text is None else text
+
+        catalog = self.catalog.get(language_code)
+        if catalog is None:
+            catalog = self._build_catalog(language_code)
+        return catalog.get((category, key), key)
 
     def get_available_languages(self) -> List[str]:
         """Getting a list of available languages from files"""
-        return [filename.split('.')[0] for filename in os.listdir(self.translations_dir) if filename.endswith('.json')]
+        if self._available_languages is None and self._open_compiled():
+            self._available_languages = list(self.compiled.languages)
+        if self._available_languages is None:
+            self._available_languages = [
+                filename.split('.')[0] for filename in os.listdir(self.translations_dir) if filename.endswith('.json')
+            ]
+        return self._available_languages
+
+    def _open_compiled(self) -> bool:
+        """Opening the compiled catalog once, it is only used if it was built from the current locale files"""
+        if self._compiled_checked:
+            return self.compiled is not None
+        self._compiled_checked = True
+
+        if not os.path.exists(self.catalog_path):
+            return False
+        try:
+            compiled = CompiledCatalog(self.catalog_path)
+        except Exception as e:
+            logger.error(f"Error opening the translation catalog: {e}")
+            return False
+        if compiled.digest != source_digest(self.translations_dir):
+            logger.warning("Translation catalog is out of date with the locale files. Using the locale files.")
+            compiled.close()
+            return False
+
+        self.compiled = compiled
+        return True
+
+    def _build_catalog(self, language_code: str) -> Dict[Tuple[str, str], str]:
+        catalog: Dict[Tuple[str, str], str] = {
+            (category, key): text
+            for category, texts in self.load_translations(language_code).items()
+            for key, text in texts.items()
+        }
+        # Unknown languages are not remembered so the catalog can't grow from arbitrary codes
+        if catalog:
+            self.catalog[language_code] = catalog
+        return catalog
+
+
+translation_manager = TranslationManager(TRANSLATIONS_DIR)
@@ -0,0 +1,503 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
+
+from bot.bot_config import bot, logger
+from bot.db_handler.db_service import count_subscribed_users, get_subscribed_users, update_delivery_failures
+from bot.keyboards.admin_kb import get_admin_panel_keyboard
+from bot.keyboards.referral_links_kb import build_referral_links_keyboard
+from bot.keyboards.render_cache import render_cache
+from bot.middlewares.rate_governor_middleware import background_requests
+from bot.translations import translation_manager
+from bot.utils.utils import load_image
+from config.redis_config import redis_manager as redis_client
+from db.database import current_session, get_session
+
+JOBS_STREAM = "broadcast:jobs"
+JOBS_GROUP = "broadcasters"
+JOB_KEY = "broadcast:job:{}"
+# Delivery outcome of every recipient of a job
+DELIVERIES_KEY = "broadcast:job:{}:deliveries"
+# Delivery failure counters of the job's chats, as written to the users table
+FAILURES_KEY = "broadcast:job:{}:failures"
+# Chats whose message wasn't sent for a reason unrelated to them, they are retried before the job finishes
+RETRY_KEY = "broadcast:job:{}:retry"
+DELIVERED = "1"
+# The chat refused the message, e.g. the bot can't write to it
+FAILED = "0"
+# The bot was blocked, the user deleted their account or the chat no longer exists
+UNREACHABLE = "2"
+# The message couldn't be sent for a reason unrelated to the chat: a network or server error,
+# a flood limit or a problem with the notification itself. It doesn't count against the chat
+# and isn't stored as the chat's outcome, the chat is kept in the retry set instead.
+NOT_SENT = "3"
+# Errors of chats that can't receive messages at all
+UNREACHABLE_ERRORS = ('chat not found', 'user is deactivated', 'bot was blocked', 'bot was kicked')
+# Errors of chats that can't receive this message right now
+RECIPIENT_ERRORS = (
+    'peer_id_invalid', 'user not found', "can't initiate conversation", 'not enough rights', 'have no rights',
+)
+# Flood limits a message waits out before it's left for the retry at the end of the job
+MAX_FLOOD_RETRIES = 3
+# Chats that failed this many mailings in a row are unsubscribed
+MAX_DELIVERY_FAILURES = 3
+# Finished jobs are kept for the admins to look at, then expire
+FINISHED_JOB_TTL = 7 * 24 * 3600
+
+
+class RenderedMessage(NamedTuple):
+    text: str
+    keyboard: InlineKeyboardMarkup
+
+
+class BroadcastJob:
+    """State of a mailing, stored in the job hash so any instance can continue it"""
+
+    def __init__(self, job_id: str, fields: Dict[str, str]) -> None:
+        self.job_id = job_id
+        self.notif_key: str = fields['notif_key']
+        self.admin_chat_id: int = int(fields['admin_chat_id'])
+        self.admin_id: int = int(fields['admin_id'])
+        self.total: int = int(fields.get('total', 0))
+        self.cursor: Optional[int] = int(fields['cursor']) if fields.get('cursor') else None
+        # File id of the uploaded photo, empty when the notification has no photo
+        self.photo: Optional[str] = fields.get('photo')
+        self.progress_message_id: Optional[int] = (
+            int(fields['progress_message_id']) if fields.get('progress_message_id') else None
+        )
+        self.sent: int = int(fields.get('sent', 0))
+        self.failed: int = int(fields.get('failed', 0))
+        self.unsubscribed: int = int(fields.get('unsubscribed', 0))
+        # Outcomes of the deliveries made by this instance, by chat
+        self.outcomes: Dict[int, str] = {}
+        self.started_at: float = float(fields.get('started_at', time.time()))
+
+    @property
+    def key(self) -> str:
+        return JOB_KEY.format(self.job_id)
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+
+class Broadcaster:
+    """
+    Sends notifications to all subscribed users in the background.
+    Every mailing is a job: its state lives in a Redis hash and its id in a stream read by a consumer
+    group, so a job left unfinished by a crashed or restarted instance is claimed by another one.
+    Recipients are read in chat_id order, page by page, and the job keeps the last finished chat_id
+    together with the outcome of every delivery, so a resumed job doesn't send a message twice.
+    The text and keyboard are rendered once per language, the photo is uploaded once and then
+    sent by its file id, and messages go out concurrently as background requests, paced by the
+    bot's rate governor behind the answers to users. The admin sees the progress in one edited message.
+    After every page the failure counters of its chats are saved, and chats that blocked the bot,
+    no longer exist or refused several mailings in a row are unsubscribed from later ones.
+    Errors that aren't caused by the chat, such as network errors or a broken notification,
+    don't change its counter: the chat is sent the message again, up to `retry_rounds` times,
+    once all pages are done, and only counts as failed when every retry failed.
+    """
+
+    def __init__(
+            self,
+            concurrency: int = 20,
+            page_size: int = 1000,
+            progress_interval: float = 10.0,
+            heartbeat_interval: float = 15.0,
+            claim_idle: float = 60.0,
+            retry_rounds: int = 3,
+            retry_delay: float = 30.0,
+    ) -> None:
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.claim_idle = claim_idle
+        self.retry_rounds = retry_rounds
+        self.retry_delay = retry_delay
+        self.consumer_name: str = uuid.uuid4().hex
+        self._consumer: Optional[asyncio.Task] = None
+        self._stopping: bool = False
+
+    def start(self) -> None:
+        """Starting the consumer that runs new jobs and takes over abandoned ones"""
+        if self._consumer and not self._consumer.done():
+            return
+        self._stopping = False
+        self._consumer = asyncio.create_task(self._consume())
+        logger.info("✅ Broadcaster started")
+
+    async def stop(self) -> None:
+        """Stopping the consumer, an interrupted job is continued after a restart or by another instance"""
+        self._stopping = True
+        if self._consumer and not self._consumer.done():
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+        self._consumer = None
+        logger.info("📁 Broadcaster stopped")
+
+    async def create_notification(self, admin_chat_id: int, admin_id: int, notif_key: str) -> str:
+        """Queuing a notification mailing to all subscribed users"""
+        async with await get_session() as session:
+            total: int = await count_subscribed_users(session)
+
+        job_id: str = uuid.uuid4().hex
+        client = await redis_client.get_client()
+        await client.hset(JOB_KEY.format(job_id), mapping={
+            'notif_key': notif_key,
+            'admin_chat_id': admin_chat_id,
+            'admin_id': admin_id,
+            'total': total,
+            'sent': 0,
+            'failed': 0,
+            'unsubscribed': 0,
+            'started_at': time.time(),
+        })
+        await client.xadd(JOBS_STREAM, {'job_id': job_id})
+        logger.info(f"Notification {notif_key} mailing queued as job {job_id} for {total} users")
+        return job_id
+
+    async def _consume(self) -> None:
+        # Jobs must not use the session of an update, they open their own
+        current_session.set(None)
+        background_requests.set(True)
+        client = await redis_client.get_client()
+        try:
+            await client.xgroup_create(JOBS_STREAM, JOBS_GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        while not self._stopping:
+            try:
+                entry: Optional[Tuple[str, str]] = await self._next_job(client)
+                if entry:
+                    await self._run_entry(client, *entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in broadcast consumer: {e}")
+                await asyncio.sleep(5)
+
+    async def _next_job(self, client) -> Optional[Tuple[str, str]]:
+        """Claiming a job abandoned by another consumer, or waiting for a new one"""
+        claimed = await client.xautoclaim(
+            JOBS_STREAM, JOBS_GROUP, self.consumer_name, int(self.claim_idle * 1000), count=1
+        )
+        entries = claimed[1] if claimed else []
+        if not entries:
+            response = await client.xreadgroup(
+                JOBS_GROUP, self.consumer_name, {JOBS_STREAM: '>'}, count=1, block=5000
+            )
+            entries = response[0][1] if response else []
+        if not entries:
+            return None
+
+        entry_id, fields = entries[0]
+        job_id = fields.get(b'job_id') or fields.get('job_id')
+        return self._decode(entry_id), self._decode(job_id)
+
+    async def _run_entry(self, client, entry_id: str, job_id: str) -> None:
+        fields: Dict = await client.hgetall(JOB_KEY.format(job_id))
+        if fields:
+            job = BroadcastJob(job_id, {self._decode(k): self._decode(v) for k, v in fields.items()})
+            heartbeat: asyncio.Task = asyncio.create_task(self._heartbeat(client, entry_id))
+            try:
+                await self._run_job(client, job)
+            finally:
+                heartbeat.cancel()
+        else:
+            logger.warning(f"Broadcast job {job_id} no longer exists")
+
+        await client.xack(JOBS_STREAM, JOBS_GROUP, entry_id)
+        await client.xdel(JOBS_STREAM, entry_id)
+
+    async def _heartbeat(self, client, entry_id: str) -> None:
+        """Keeping the job claimed so other consumers don't take it over while it runs"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await client.xclaim(JOBS_STREAM, JOBS_GROUP, self.consumer_name, 0, [entry_id], justid=True)
+            except Exception as e:
+                logger.warning(f"Error renewing broadcast job claim: {e}")
+
+    async def _run_job(self, client, job: BroadcastJob) -> None:
+        if job.progress_message_id is None:
+            progress: Message = await bot.send_message(
+                chat_id=job.admin_chat_id,
+                text=f"📬 <i>Mailing started for <b>{job.total}</b> users</i>",  # Add translation ‼️
+            )
+            job.progress_message_id = progress.message_id
+            await client.hset(job.key, 'progress_message_id', job.progress_message_id)
+        else:
+            logger.info(f"Resuming broadcast job {job.job_id} after chat {job.cursor}")
+
+        reporter: asyncio.Task = asyncio.create_task(self._report_progress(job))
+        try:
+            while True:
+                async with await get_session() as session:
+                    users = await get_subscribed_users(session, job.cursor, self.page_size)
+                if not users:
+                    break
+                await self._send_page(client, job, users)
+
+                # Everyone up to the last chat of the page has been handled
+                job.cursor = users[-1].chat_id
+                await client.hset(job.key, 'cursor', job.cursor)
+
+            await self._retry_not_sent(client, job)
+        finally:
+            reporter.cancel()
+
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(job.key, 'finished_at', time.time())
+        pipe.expire(job.key, FINISHED_JOB_TTL)
+        pipe.expire(DELIVERIES_KEY.format(job.job_id), FINISHED_JOB_TTL)
+        pipe.expire(FAILURES_KEY.format(job.job_id), FINISHED_JOB_TTL)
+        await pipe.execute()
+
+        await bot.send_message(
+            chat_id=job.admin_chat_id,
+            text=(
+                "📬 <i>The mailing has been successfully <b>completed</b>!!</i> 📭\n"  # Add translation ‼️
+                f"<i>Sent: <b>{job.sent}</b>, failed: <b>{job.failed}</b>, "
+                f"unsubscribed: <b>{job.unsubscribed}</b>, "
+                f"time: <b>{int(time.time() - job.started_at)}</b> sec</i>"
+            ),
+            reply_markup=await get_admin_panel_keyboard(job.admin_id),
+        )
+        logger.info(
+            f"Notification {job.notif_key} sent to {job.sent} users, failed for {job.failed}, "
+            f"{job.unsubscribed} unreachable chats unsubscribed"
+        )
+
+    async def _retry_not_sent(self, client, job: BroadcastJob) -> None:
+        """Sending the message again to the chats it couldn't be sent to, the rest count as failed"""
+        retry_key: str = RETRY_KEY.format(job.job_id)
+        for _ in range(self.retry_rounds):
+            chat_ids: List[int] = sorted(int(chat_id) for chat_id in await client.smembers(retry_key))
+            if not chat_ids:
+                return
+            logger.info(f"Retrying broadcast job {job.job_id} for {len(chat_ids)} chats in {self.retry_delay} sec")
+            await asyncio.sleep(self.retry_delay)
+
+            for start in range(0, len(chat_ids), self.page_size):
+                page: List[int] = chat_ids[start:start + self.page_size]
+                async with await get_session() as session:
+                    users = await get_subscribed_users(session, chat_ids=page)
+                # Chats that unsubscribed in the meantime are no longer retried
+                gone: Set[int] = set(page).difference(user.chat_id for user in users)
+                if gone:
+                    await client.srem(retry_key, *gone)
+                if users:
+                    await self._send_page(client, job, users)
+
+        given_up: int = await client.scard(retry_key)
+        if given_up:
+            job.failed += given_up
+            pipe = client.pipeline(transaction=True)
+            pipe.hincrby(job.key, 'failed', given_up)
+            pipe.delete(retry_key)
+            await pipe.execute()
+            logger.warning(f"Broadcast job {job.job_id} gave up on {given_up} chats")
+
+    async def _send_page(self, client, job: BroadcastJob, users) -> None:
+        # Recipients handled before an interruption are skipped
+        delivered = await client.hmget(DELIVERIES_KEY.format(job.job_id), [user.chat_id for user in users])
+        rendered: Dict[str, RenderedMessage] = {}
+        recipients: List[Tuple[int, str, RenderedMessage]] = []
+        for user, outcome in zip(users, delivered):
+            if outcome is not None:
+                continue
+            language_code: str = user.language_code or 'en'
+            if language_code not in rendered:
+                rendered[language_code] = self.render(language_code, job.notif_key)
+            recipients.append((user.chat_id, user.first_name, rendered[language_code]))
+
+        if job.photo is None:
+            photo: Optional[FSInputFile | str] = await load_image(
+                "notification", specific_image=f"{job.notif_key}.png")
+
+            # The photo is uploaded with the first message, the rest reuse its file id
+            while isinstance(photo, FSInputFile) and recipients:
+                message: Optional[Message] = await self._deliver(client, job, *recipients.pop(0), photo)
+                if message and message.photo:
+                    photo = message.photo[-1].file_id
+            if photo is None or isinstance(photo, str):
+                job.photo = photo or ''
+                await client.hset(job.key, 'photo', job.photo)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for recipient in recipients:
+            queue.put_nowait(recipient)
+        workers: List[asyncio.Task] = [
+            asyncio.create_task(self._worker(client, job, queue))
+            for _ in range(min(self.concurrency, len(recipients)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        await self._update_failures(client, job, users, delivered)
+
+    async def _update_failures(self, client, job: BroadcastJob, users, delivered: List) -> None:
+        """Counting failed mailings per chat and unsubscribing the chats that can't be reached"""
+        failures: Dict[int, int] = {}
+        unreachable: Set[int] = set()
+        for user, recorded in zip(users, delivered):
+            outcome: Optional[str] = self._decode(recorded) if recorded is not None else job.outcomes.pop(
+                user.chat_id, None)
+            if outcome == DELIVERED:
+                # Only chats that had failed before need their counter reset
+                if user.delivery_failures:
+                    failures[user.chat_id] = 0
+            elif outcome in (FAILED, UNREACHABLE):
+                failures[user.chat_id] = user.delivery_failures + 1
+                if outcome == UNREACHABLE:
+                    unreachable.add(user.chat_id)
+        if not failures:
+            return
+
+        # The first counters computed for a chat are kept, so a page replayed after a crash
+        # writes the same values instead of counting its failures again
+        chat_ids: List[int] = list(failures)
+        pipe = client.pipeline(transaction=True)
+        for chat_id in chat_ids:
+            pipe.hsetnx(FAILURES_KEY.format(job.job_id), chat_id, failures[chat_id])
+        pipe.hmget(FAILURES_KEY.format(job.job_id), chat_ids)
+        results: List = await pipe.execute()
+        new_chats: Set[int] = {chat_id for chat_id, added in zip(chat_ids, results) if added}
+        failures = {chat_id: int(recorded) for chat_id, recorded in zip(chat_ids, results[-1])}
+        unsubscribed: List[int] = [
+            chat_id for chat_id in failures
+            if chat_id in unreachable or failures[chat_id] >= MAX_DELIVERY_FAILURES
+        ]
+
+        async with await get_session() as session:
+            await update_delivery_failures(session, failures, unsubscribed)
+        newly_unsubscribed: int = len(new_chats.intersection(unsubscribed))
+        if newly_unsubscribed:
+            job.unsubscribed += newly_unsubscribed
+            await client.hincrby(job.key, 'unsubscribed', newly_unsubscribed)
+
+    @staticmethod
+    def render(language_code: str, notif_key: str) -> RenderedMessage:
+        """Rendering the notification text and keyboard for one language"""
+        return RenderedMessage(
+            translation_manager.get_translation(language_code, "notifications", notif_key),
+            render_cache.get("referral_links", language_code, build_referral_links_keyboard),
+        )
+
+    async def _worker(self, client, job: BroadcastJob, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            chat_id, first_name, rendered = queue.get_nowait()
+            try:
+                await self._deliver(client, job, chat_id, first_name, rendered, job.photo)
+            except Exception as e:
+                # The rest of the page is still sent, the chat has no recorded outcome and gets it after a resume
+                logger.error(f"Error delivering notification to {chat_id}: {e}")
+
+    async def _deliver(
+            self,
+            client,
+            job: BroadcastJob,
+            chat_id: int,
+            first_name: str,
+            rendered: RenderedMessage,
+            photo: Optional[FSInputFile | str],
+    ) -> Optional[Message]:
+        personalized_text: str = f"{first_name}, {rendered.text}"
+        message: Optional[Message] = None
+        outcome: str = DELIVERED
+        attempt: int = 0
+        while True:
+            try:
+                if photo:
+                    message = await bot.send_photo(
+                        chat_id=chat_id, photo=photo, caption=personalized_text, reply_markup=rendered.keyboard
+                    )
+                else:
+                    message = await bot.send_message(
+                        chat_id=chat_id, text=personalized_text, reply_markup=rendered.keyboard
+                    )
+                break
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > MAX_FLOOD_RETRIES:
+                    logger.error(f"Flood limit reached too often for {chat_id}, the notification is retried later")
+                    outcome = NOT_SENT
+                    break
+                logger.warning(f"Flood limit reached while sending notifications, retrying in {e.retry_after} sec")
+                await asyncio.sleep(e.retry_after)
+            except TelegramAPIError as e:
+                logger.error(f"Failed to send notification to {chat_id}: {e}")
+                outcome = self.failure_outcome(e)
+                break
+
+        await self._record_delivery(client, job, chat_id, outcome)
+        return message
+
+    @staticmethod
+    def failure_outcome(error: TelegramAPIError) -> str:
+        """Telling errors caused by the recipient from those caused by the network, Telegram or the message"""
+        if isinstance(error, TelegramForbiddenError):
+            return UNREACHABLE
+        if not isinstance(error, TelegramBadRequest):
+            return NOT_SENT
+        message: str = error.message.lower()
+        if any(text in message for text in UNREACHABLE_ERRORS):
+            return UNREACHABLE
+        if any(text in message for text in RECIPIENT_ERRORS):
+            return FAILED
+        return NOT_SENT
+
+    @staticmethod
+    async def _record_delivery(client, job: BroadcastJob, chat_id: int, outcome: str) -> None:
+        job.outcomes[chat_id] = outcome
+        if outcome == NOT_SENT:
+            # Left out of the deliveries, so a resumed page sends to the chat again as well
+            await client.sadd(RETRY_KEY.format(job.job_id), chat_id)
+            return
+
+        if outcome == DELIVERED:
+            job.sent += 1
+        else:
+            job.failed += 1
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(DELIVERIES_KEY.format(job.job_id), chat_id, outcome)
+        pipe.srem(RETRY_KEY.format(job.job_id), chat_id)
+        pipe.hincrby(job.key, 'sent' if outcome == DELIVERED else 'failed', 1)
+        await pipe.execute()
+
+    async def _report_progress(self, job: BroadcastJob) -> None:
+        reported: int = job.processed
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            # Telegram rejects edits that don't change the message
+            if job.processed == reported:
+                continue
+            reported = job.processed
+            try:
+                await bot.edit_message_text(
+                    chat_id=job.admin_chat_id,
+                    message_id=job.progress_message_id,
+                    text=(
+                        f"📬 <i>Mailing in progress: <b>{job.processed}</b> of <b>{job.total}</b></i>\n"
+                        f"<i>Sent: <b>{job.sent}</b>, failed: <b>{job.failed}</b></i>"
+                    ),
+                )
+            except TelegramAPIError as e:
+                logger.warning(f"Error updating mailing progress: {e}")
+
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+broadcaster = Broadcaster()
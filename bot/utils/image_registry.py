@@ -0,0 +1,121 @@
+import os
+import random
+from typing import Dict, List, Optional
+
+from aiogram.types import FSInputFile
+
+from bot.bot_config import BOT_ID, logger
+from config.redis_config import redis_manager as redis_client
+
+IMAGES_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "images"))
+
+# File ids are only valid for the bot that uploaded the file
+FILE_IDS_KEY = f"images:file_ids:{BOT_ID}"
+
+
+class ImageRegistry:
+    """
+    Indexes the bot images once and remembers the file_id Telegram returns after the first upload
+    of every file, so later sends reuse it instead of uploading the bytes again.
+    Images are returned as files and ImageUploadMiddleware puts the file id in when they are sent.
+    File ids are stored in Redis under the file's path, size and modification time:
+    a replaced image is uploaded again.
+    """
+
+    def __init__(self, images_dir: str) -> None:
+        self.images_dir = images_dir
+        self._index: Optional[Dict[str, List[str]]] = None
+        self._fingerprints: Dict[str, str] = {}
+        self._file_ids: Dict[str, str] = {}
+        self._loaded: bool = False
+
+    def index(self) -> Dict[str, List[str]]:
+        """Listing the images of every subfolder once"""
+        if self._index is None:
+            self._index = {}
+            if os.path.isdir(self.images_dir):
+                for subfolder in sorted(os.listdir(self.images_dir)):
+                    subfolder_dir = os.path.join(self.images_dir, subfolder)
+                    if not os.path.isdir(subfolder_dir):
+                        continue
+                    self._index[subfolder] = sorted(
+                        f for f in os.listdir(subfolder_dir) if os.path.isfile(os.path.join(subfolder_dir, f))
+                    )
+                    for filename in self._index[subfolder]:
+                        path = os.path.join(subfolder_dir, filename)
+                        stat = os.stat(path)
+                        relative_path: str = os.path.relpath(path, self.images_dir)
+                        self._fingerprints[path] = f"{relative_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        return self._index
+
+    async def load(self) -> None:
+        """Reading the file ids recorded by earlier runs or other instances"""
+        self.index()
+        try:
+            client = await redis_client.get_client()
+            stored = await client.hgetall(FILE_IDS_KEY)
+        except Exception as e:
+            logger.error(f"Error loading image file ids: {e}")
+            return
+
+        file_ids: Dict[str, str] = {
+            (field.decode('utf-8') if isinstance(field, bytes) else field):
+                (file_id.decode('utf-8') if isinstance(file_id, bytes) else file_id)
+            for field, file_id in stored.items()
+        }
+        for path, fingerprint in self._fingerprints.items():
+            if fingerprint in file_ids:
+                self._file_ids[path] = file_ids[fingerprint]
+        self._loaded = True
+        logger.info(f"✅ Images indexed: {len(self._fingerprints)}, already uploaded: {len(self._file_ids)}")
+
+    async def get_image(self, subfolder: str, specific_image: str = None) -> FSInputFile | None:
+        """
+        Returning the image file, the upload middleware sends it by its file id once it has been uploaded
+        and uploads it again if Telegram rejects the file id
+        """
+        if not self._loaded:
+            await self.load()
+
+        image_files: Optional[List[str]] = self.index().get(subfolder)
+        if image_files is None:
+            logger.error(f"Directory {os.path.join(self.images_dir, subfolder)} does not exist or is not a directory.")
+            return None
+
+        # If a specific image is specified, otherwise select a random image
+        if specific_image:
+            if specific_image not in image_files:
+                logger.error(f"Image {specific_image} not found in {os.path.join(self.images_dir, subfolder)}.")
+                return None
+            filename: str = specific_image
+        elif image_files:
+            filename = random.choice(image_files)
+        else:
+            logger.error(f"Directory {os.path.join(self.images_dir, subfolder)} has no images.")
+            return None
+
+        path: str = os.path.join(self.images_dir, subfolder, filename)
+        return FSInputFile(path)
+
+    def get_file_id(self, path: str) -> Optional[str]:
+        return self._file_ids.get(os.path.normpath(path))
+
+    async def remember(self, path: str, file_id: str) -> None:
+        """Recording the file id Telegram returned for an uploaded image"""
+        path = os.path.normpath(path)
+        fingerprint: Optional[str] = self._fingerprints.get(path)
+        if fingerprint is None or self._file_ids.get(path) == file_id:
+            return
+
+        self._file_ids[path] = file_id
+        try:
+            client = await redis_client.get_client()
+            await client.hset(FILE_IDS_KEY, fingerprint, file_id)
+        except Exception as e:
+            logger.error(f"Error saving file id of {path}: {e}")
+
+    def forget(self, path: str) -> None:
+        self._file_ids.pop(os.path.normpath(path), None)
+
+
+image_registry = ImageRegistry(IMAGES_DIR)
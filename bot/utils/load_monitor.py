@@ -0,0 +1,78 @@
+import asyncio
+from typing import Optional
+
+from bot.bot_config import logger
+from db.database import MAX_OVERFLOW, POOL_SIZE, engine
+
+
+class LoadMonitor:
+    """
+    Samples the event loop lag and the use of the database connection pool.
+    `pressure` is 1.0 when either reaches its budget: the loop falls `lag_budget` seconds behind,
+    or `pool_budget` of the pool's connections are checked out, close to the point where new queries wait.
+    """
+
+    def __init__(
+            self,
+            interval: float = 0.5,
+            lag_budget: float = 0.25,
+            pool_budget: float = 0.9,
+            smoothing: float = 0.3,
+    ) -> None:
+        self.interval = interval
+        self.lag_budget = lag_budget
+        self.pool_budget = pool_budget
+        # Weight of the newest sample, short spikes don't shed load on their own
+        self.smoothing = smoothing
+        self.loop_lag: float = 0.0
+        self.pool_usage: float = 0.0
+        self._overloaded: bool = False
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._worker and not self._worker.done():
+            return
+        self._worker = asyncio.create_task(self._run())
+        logger.info("✅ Load monitor started")
+
+    async def stop(self) -> None:
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        logger.info("📁 Load monitor stopped")
+
+    @property
+    def pressure(self) -> float:
+        return max(self.loop_lag / self.lag_budget, self.pool_usage / self.pool_budget)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started: float = loop.time()
+            await asyncio.sleep(self.interval)
+            try:
+                self._sample(max(loop.time() - started - self.interval, 0.0))
+            except Exception as e:
+                logger.error(f"Error sampling the bot load: {e}")
+
+    def _sample(self, lag: float) -> None:
+        usage: float = engine.sync_engine.pool.checkedout() / (POOL_SIZE + MAX_OVERFLOW)
+
+        self.loop_lag += self.smoothing * (lag - self.loop_lag)
+        self.pool_usage += self.smoothing * (usage - self.pool_usage)
+
+        overloaded: bool = self.pressure >= 1.0
+        if overloaded != self._overloaded:
+            self._overloaded = overloaded
+            state: str = "overloaded, shedding requests" if overloaded else "back to normal load"
+            logger.warning(
+                f"Bot is {state}: loop lag {self.loop_lag * 1000:.0f} ms, "
+                f"{self.pool_usage:.0%} of the database pool in use"
+            )
+
+
+load_monitor = LoadMonitor()
@@ -5,6 +5,14 @@ from typing import Optional
 
 import coloredlogs
 
+LOG_FORMAT = '%(asctime)s | %(name)s | %(levelname)s | %(message)s'
+
+
+def _file_handler(log_file_path: str) -> logging.Handler:
+    handler = logging.handlers.RotatingFileHandler(log_file_path, maxBytes=10 * 1024 * 1024, backupCount=5)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
 
 def logging_setup(log_name: str, log_file: str) -> Optional[logging.Logger]:
     """
@@ -22,12 +30,10 @@ def logging_setup(log_name: str, log_file: str) -> Optional[logging.Logger]:
     # Configuring basic logging
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s | %(name)s | %(levelname)s | %(message)s',
+        format=LOG_FORMAT,
         handlers=[
             logging.StreamHandler(),
-            logging.handlers.RotatingFileHandler(
-                log_file_path, maxBytes=10 * 1024 * 1024, backupCount=5
-            )
+            _file_handler(log_file_path),
         ]
     )
 
@@ -35,7 +41,7 @@ def logging_setup(log_name: str, log_file: str) -> Optional[logging.Logger]:
     coloredlogs.install(
         level='INFO',
         logger=logging.getLogger(log_name),
-        fmt='%(asctime)s | %(name)s | %(levelname)s | %(message)s',
+        fmt=LOG_FORMAT,
         level_styles={
             'info': {'color': 'green'},
             'warning': {'color': 'yellow'},
@@ -50,3 +56,17 @@ def logging_setup(log_name: str, log_file: str) -> Optional[logging.Logger]:
     )
 
     return logging.getLogger(log_name)
+
+
+def use_worker_log_file(worker_index: int) -> None:
+    """
+    Moving the file logging of a forked worker process to its own file, e.g. bot.worker1.log:
+    log rotation isn't safe when several processes write to the same file
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.handlers.RotatingFileHandler):
+            base, extension = os.path.splitext(handler.baseFilename)
+            root.removeHandler(handler)
+            handler.close()
+            root.addHandler(_file_handler(f"{base}.worker{worker_index}{extension}"))
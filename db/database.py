@@ -1,4 +1,7 @@
 import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
 
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -12,8 +15,12 @@ def get_database_url() -> str:
             f"{os.getenv('DATABASE_HOST')}:{os.getenv('DATABASE_PORT')}/{os.getenv('DATABASE_NAME')}")
 
 
+# Connections kept open, and extra connections opened while they are all in use
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+
 # Creating an asynchronous engine
-engine = create_async_engine(get_database_url(), echo=False, pool_size=5, max_overflow=10)
+engine = create_async_engine(get_database_url(), echo=False, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
 
 # Session Factory
 AsyncSessionLocal = async_sessionmaker(
@@ -27,3 +34,31 @@ AsyncSessionLocal = async_sessionmaker(
 async def get_session() -> AsyncSession:
     """Creates an asynchronous session"""
     return AsyncSessionLocal()
+
+
+# Session of the update being processed, set by the bot's session middleware
+current_session: ContextVar[Optional[AsyncSession]] = ContextVar('current_session', default=None)
+
+
+# Sharing the session of the current update
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """Using the session of the current update, or a new session outside of an update"""
+    session: Optional[AsyncSession] = current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+# Returning the connection of the current update's session to the pool
+async def release_connection() -> None:
+    """
+    Committing the current update's session at a point where it has only read, so it doesn't keep
+    its pool connection while the handler waits on Telegram; the next query takes a connection again
+    """
+    session: Optional[AsyncSession] = current_session.get()
+    if session is not None and session.in_transaction():
+        await session.commit()